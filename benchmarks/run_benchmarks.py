@@ -0,0 +1,159 @@
+"""
+End-to-end benchmarks on synthetic EcoSpold02 files.
+
+    python -m benchmarks.run_benchmarks --sizes 100,1000,10000 --output bench.json
+
+Every stage is timed over --repeat runs (min and median wall time), then run once more
+under tracemalloc for its peak Python memory. Results go to a JSON file tagged with the
+current git commit so runs can be compared between commits.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from data_extraction import EcoSpoldProcessor, get_table_writer
+from data_treatment import ElementaryFlowProcessor, IntermediateFlowProcessor
+
+from .synthetic_spold import generate_spold
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'seconds_min': min(timings), 'seconds_median': statistics.median(timings), 'peak_bytes': peak}
+
+
+def _stages(spold_path, output_dir, excel):
+    """
+    Returns (stage name, callable) pairs in pipeline order. Each callable runs its stage
+    from the inputs prepared by the previous ones, so stages are timed in isolation.
+    """
+    processor = EcoSpoldProcessor(spold_path)
+    _, df_intermediate, df_elementary = processor.extract_all()
+    df_intermediate_num, df_elementary_num = processor.convert_numerical_columns(df_intermediate.copy(), df_elementary.copy())
+
+    intermediate_processor = IntermediateFlowProcessor()
+    df_intermediate_kg = intermediate_processor.flip_negative_amounts(intermediate_processor.get_m3_to_kg(df_intermediate))
+
+    elementary_processor = ElementaryFlowProcessor()
+    df_combined, grouped_kg = elementary_processor.get_grouped_flows(df_elementary)
+    df_el_combined = elementary_processor.calculate_elemental_composition(df_combined, grouped_kg)
+    df_total = elementary_processor.calculate_total_concentration(df_el_combined.copy())
+
+    def export(output_format):
+        def run():
+            options = {} if output_format == 'excel' else {'append': False}
+            path = os.path.join(output_dir, 'export.xlsx' if output_format == 'excel' else output_format)
+            with get_table_writer(output_format, path, **options) as writer:
+                writer.write('intermediate_exchanges', df_intermediate_num)
+                writer.write('elementary_exchanges', df_elementary_num)
+                writer.write('elementary_concentrations', df_total)
+        return run
+
+    stages = [
+        ('extraction.parse_dom', lambda: EcoSpoldProcessor(spold_path)),
+        ('extraction.extract_all_dom', lambda: EcoSpoldProcessor(spold_path).extract_all()),
+        ('extraction.extract_all_streaming', lambda: EcoSpoldProcessor(spold_path, streaming=True).extract_all()),
+        ('extraction.convert_numerical_columns',
+         lambda: processor.convert_numerical_columns(df_intermediate.copy(), df_elementary.copy())),
+        ('intermediate.get_m3_to_kg', lambda: intermediate_processor.get_m3_to_kg(df_intermediate)),
+        ('intermediate.calculate_flow_composition',
+         lambda: intermediate_processor.calculate_flow_composition(df_intermediate_kg)),
+        ('elementary.get_grouped_flows', lambda: elementary_processor.get_grouped_flows(df_elementary)),
+        ('elementary.calculate_elemental_composition',
+         lambda: elementary_processor.calculate_elemental_composition(df_combined, grouped_kg)),
+        ('elementary.calculate_total_concentration',
+         lambda: elementary_processor.calculate_total_concentration(df_el_combined.copy())),
+        ('export.parquet', export('parquet')),
+        ('export.csv', export('csv')),
+    ]
+    if excel:
+        stages.append(('export.excel', export('excel')))
+    return stages
+
+
+def run_benchmarks(sizes, properties_per_exchange=4, m3_share=0.1, uncertainty_share=0.8,
+                   repeat=3, excel=False, seed=0):
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size in sizes:
+            spold_path = generate_spold(os.path.join(work_dir, f"synthetic_{size}.spold"),
+                                        n_intermediate=size, n_elementary=size,
+                                        properties_per_exchange=properties_per_exchange,
+                                        m3_share=m3_share, uncertainty_share=uncertainty_share, seed=seed)
+            output_dir = os.path.join(work_dir, f"output_{size}")
+            for stage, func in _stages(spold_path, output_dir, excel):
+                result = {'stage': stage, 'exchanges': 2 * size, 'file_bytes': os.path.getsize(spold_path)}
+                result.update(_measure(func, repeat))
+                results.append(result)
+                print(f"{stage:<45} {2 * size:>8} exchanges  {result['seconds_median']:.4f} s  "
+                      f"{result['peak_bytes'] / 1e6:.1f} MB", file=sys.stderr)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100,1000,10000',
+                        help="comma-separated numbers of intermediate (and elementary) exchanges per file")
+    parser.add_argument('--properties', type=int, default=4, help="properties per intermediate exchange")
+    parser.add_argument('--m3-share', type=float, default=0.1, help="share of intermediate exchanges in m3")
+    parser.add_argument('--uncertainty-share', type=float, default=0.8, help="share of exchanges with uncertainty")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--excel', action='store_true', help="also benchmark the Excel export")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args(argv)
+
+    config = {
+        'sizes': [int(size) for size in args.sizes.split(',')],
+        'properties_per_exchange': args.properties,
+        'm3_share': args.m3_share,
+        'uncertainty_share': args.uncertainty_share,
+        'repeat': args.repeat,
+        'excel': args.excel,
+        'seed': args.seed,
+    }
+    results = run_benchmarks(**config)
+
+    report = {
+        'commit': _git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': config,
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results saved to: {os.path.abspath(args.output)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import os
+import random
+from xml.sax.saxutils import escape
+
+ECOSPOLD_NS = 'http://www.EcoInvent.org/EcoSpold02'
+
+ELEMENTARY_FLOWS = [
+    ('Carbon dioxide, fossil', 'kg', 'air', 'urban air close to ground'),
+    ('Nitrogen oxides', 'kg', 'air', 'non-urban air or from high stacks'),
+    ('Sulfur dioxide', 'kg', 'air', 'unspecified'),
+    ('Ammonium, ion', 'kg', 'water', 'surface water'),
+    ('Phosphorus', 'kg', 'water', 'ground-, long-term'),
+    ('Sulfuric acid', 'kg', 'water', 'surface water'),
+    ('Methane, non-fossil', 'kg', 'air', 'unspecified'),
+    ('COD, Chemical Oxygen Demand', 'kg', 'water', 'surface water'),
+    ('Water', 'm3', 'water', 'surface water'),
+    ('Water, river', 'm3', 'natural resource', 'in water'),
+    ('Water, well, in ground', 'm3', 'natural resource', 'in water'),
+    ('Occupation, industrial area', 'm2*year', 'natural resource', 'land'),
+]
+
+INTERMEDIATE_PRODUCTS = ['steel, low-alloyed', 'electricity, medium voltage', 'tap water', 'wood chips, wet',
+                         'diesel', 'transport, freight, lorry', 'cement, Portland', 'sodium hydroxide']
+
+PROPERTIES = [
+    ('dry mass', 'kg'), ('wet mass', 'kg'), ('water content', 'dimensionless'),
+    ('carbon content', 'dimensionless'), ('carbon content, fossil', 'dimensionless'),
+    ('nitrogen content', 'dimensionless'), ('sulfur content', 'dimensionless'),
+    ('price', 'EUR2005'), ('water in wet mass', 'kg'),
+]
+
+
+def _uid(rng):
+    return '%08x-%04x-%04x-%04x-%012x' % (rng.getrandbits(32), rng.getrandbits(16), rng.getrandbits(16),
+                                          rng.getrandbits(16), rng.getrandbits(48))
+
+
+def _uncertainty(rng, amount):
+    variance = rng.uniform(0.0006, 0.3)
+    return (
+        f'<uncertainty><lognormal meanValue="{abs(amount)!r}" mu="0" variance="{variance!r}" '
+        f'varianceWithPedigreeUncertainty="{variance + 0.0006!r}"/>'
+        '<pedigreeMatrix reliability="2" completeness="2" temporalCorrelation="3" geographicalCorrelation="1" '
+        'furtherTechnologyCorrelation="1"/><comment xml:lang="en">Synthetic basic uncertainty.</comment></uncertainty>'
+    )
+
+
+def _properties(rng, count, unit):
+    parts = []
+    for name, prop_unit in PROPERTIES[:count]:
+        if name == 'wet mass':
+            amount = rng.uniform(500, 1500) if unit == 'm3' else 1.0
+        elif prop_unit == 'dimensionless':
+            amount = rng.uniform(0, 0.3)
+        else:
+            amount = rng.uniform(0, 1)
+        parts.append(
+            f'<property propertyId="{_uid(rng)}" amount="{amount!r}" unitId="{_uid(rng)}">'
+            f'<name xml:lang="en">{escape(name)}</name><unitName xml:lang="en">{escape(prop_unit)}</unitName></property>'
+        )
+    return ''.join(parts)
+
+
+def generate_spold(path, n_intermediate=50, n_elementary=50, properties_per_exchange=4,
+                   m3_share=0.1, uncertainty_share=0.8, seed=0):
+    """
+    Writes a synthetic EcoSpold02 unit process with the given numbers of exchanges.
+    The first intermediate exchange is the reference product. m3_share is the share of
+    intermediate exchanges in m3, uncertainty_share the share of exchanges with a
+    lognormal uncertainty block. Returns path.
+    """
+    rng = random.Random(seed)
+    properties_per_exchange = min(properties_per_exchange, len(PROPERTIES))
+
+    exchanges = []
+    for i in range(n_intermediate):
+        unit = 'm3' if i and rng.random() < m3_share else 'kg'
+        amount = 1.0 if i == 0 else rng.uniform(-0.5, 5.0)
+        name = INTERMEDIATE_PRODUCTS[i % len(INTERMEDIATE_PRODUCTS)] if i else 'synthetic product'
+        group = '<outputGroup>0</outputGroup>' if i == 0 else '<inputGroup>5</inputGroup>'
+        link = f' activityLinkId="{_uid(rng)}"' if i else ''
+        exchanges.append(
+            f'<intermediateExchange id="{_uid(rng)}" unitId="{_uid(rng)}" amount="{amount!r}" '
+            f'intermediateExchangeId="{_uid(rng)}"{link}>'
+            f'<name xml:lang="en">{escape(name)}</name><unitName xml:lang="en">{unit}</unitName>'
+            f'<comment xml:lang="en">Synthetic exchange {i}.</comment>'
+            + (_uncertainty(rng, amount) if i and rng.random() < uncertainty_share else '')
+            + _properties(rng, properties_per_exchange, unit)
+            + f'<classification classificationId="{_uid(rng)}"><classificationSystem xml:lang="en">CPC</classificationSystem>'
+            f'<classificationValue xml:lang="en">{4000 + i % 50}: synthetic goods</classificationValue></classification>'
+            + group + '</intermediateExchange>'
+        )
+
+    for i in range(n_elementary):
+        name, unit, compartment, subcompartment = ELEMENTARY_FLOWS[rng.randrange(len(ELEMENTARY_FLOWS))]
+        amount = rng.lognormvariate(-6, 2)
+        group = '<inputGroup>4</inputGroup>' if compartment == 'natural resource' else '<outputGroup>4</outputGroup>'
+        exchanges.append(
+            f'<elementaryExchange id="{_uid(rng)}" unitId="{_uid(rng)}" amount="{amount!r}" '
+            f'elementaryExchangeId="{_uid(rng)}">'
+            f'<name xml:lang="en">{escape(name)}</name><unitName xml:lang="en">{escape(unit)}</unitName>'
+            + (_uncertainty(rng, amount) if rng.random() < uncertainty_share else '')
+            + f'<compartment subcompartmentId="{_uid(rng)}"><compartment xml:lang="en">{escape(compartment)}</compartment>'
+            f'<subcompartment xml:lang="en">{escape(subcompartment)}</subcompartment></compartment>'
+            + group + '</elementaryExchange>'
+        )
+
+    activity_id = _uid(rng)
+    person_id = _uid(rng)
+    document = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<ecoSpold xmlns="{ECOSPOLD_NS}"><activityDataset><activityDescription>'
+        f'<activity id="{activity_id}" activityNameId="{_uid(rng)}" type="1" specialActivityType="0">'
+        '<activityName xml:lang="en">synthetic activity</activityName>'
+        '<generalComment><text xml:lang="en" index="0">Synthetic dataset for benchmarks.</text></generalComment>'
+        '</activity>'
+        f'<geography geographyId="{_uid(rng)}"><shortname xml:lang="en">GLO</shortname></geography>'
+        '<technology technologyLevel="3"><comment><text xml:lang="en" index="0">Synthetic technology.</text></comment></technology>'
+        '<timePeriod startDate="2020-01-01" endDate="2023-12-31" isDataValidForEntirePeriod="true">'
+        '<comment><text xml:lang="en" index="0">Synthetic period.</text></comment></timePeriod>'
+        f'<macroEconomicScenario macroEconomicScenarioId="{_uid(rng)}"><name xml:lang="en">Business-as-Usual</name>'
+        '</macroEconomicScenario></activityDescription>'
+        f'<flowData>{"".join(exchanges)}</flowData>'
+        f'<modellingAndValidation><representativeness systemModelId="{_uid(rng)}">'
+        '<systemModelName xml:lang="en">Undefined</systemModelName></representativeness></modellingAndValidation>'
+        f'<administrativeInformation><dataEntryBy personId="{person_id}" personName="Benchmark" '
+        'personEmail="benchmark@example.org"/>'
+        f'<dataGeneratorAndPublication personId="{person_id}" personName="Benchmark" '
+        'personEmail="benchmark@example.org" isCopyrightProtected="false" accessRestrictedTo="0"/>'
+        '<fileAttributes majorRelease="3" minorRelease="0" majorRevision="1" minorRevision="0" '
+        'defaultLanguage="en" creationTimestamp="2024-01-01T00:00:00" lastEditTimestamp="2024-01-01T00:00:00" '
+        'internalSchemaVersion="2.0.10"/></administrativeInformation>'
+        '</activityDataset></ecoSpold>\n'
+    )
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(document)
+    return path
+
+
+def generate_database(directory, n_files, **options):
+    """
+    Writes n_files synthetic datasets named '<activity>_<product>.spold' into directory.
+    """
+    seed = options.pop('seed', 0)
+    return [generate_spold(os.path.join(directory, f"{i:08d}-0000-0000-0000-000000000000_product.spold"),
+                           seed=seed + i, **options)
+            for i in range(n_files)]
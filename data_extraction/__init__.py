@@ -0,0 +1,9 @@
+from .extract_ei_spold_data import EcoSpoldProcessor, open_spold_source
+from .extract_ei_database import EcoSpoldDatabaseExtractor, find_spold_files
+from .instrumentation import (Instrumentation, JsonLinesSink, MemorySink, disable_instrumentation,
+                              enable_instrumentation, file_scope, get_instrumentation, instrumented)
+from .spold_archive import SpoldArchive
+from .spold_cache import SpoldCache
+from .spold_catalog import SpoldCatalog
+from .table_writers import (CsvTableWriter, ExcelTableWriter, FeatherTableWriter, ParquetTableWriter,
+                            get_table_writer)
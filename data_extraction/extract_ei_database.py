@@ -0,0 +1,269 @@
+import glob
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from .extract_ei_spold_data import EcoSpoldProcessor, open_spold_source
+from .instrumentation import (MemorySink, count, disable_instrumentation, enable_instrumentation, file_scope,
+                              get_instrumentation)
+from .spold_archive import SpoldArchive, is_archive
+from .spold_cache import SpoldCache
+
+
+def find_spold_files(source):
+    """
+    Returns the sorted .spold files of a directory, the files matching a glob pattern,
+    the given list of files (e.g. selected with SpoldCatalog.files()), or the .spold
+    members of a zip or tar archive (a tar archive is decompressed to list them).
+    A list may also hold the bytes or open binary files of .spold files, it is then
+    kept in the given order.
+    """
+    if isinstance(source, (list, tuple)):
+        if all(isinstance(file_path, (str, os.PathLike)) for file_path in source):
+            return sorted(source)
+        return list(source)
+    if is_archive(source):
+        return SpoldArchive(source).members()
+    if hasattr(source, 'read'):
+        raise ValueError(f"Not a zip or tar archive: {source!r}.")
+    if os.path.isdir(source):
+        return sorted(glob.glob(os.path.join(source, '*.spold')))
+    return sorted(glob.glob(source, recursive=True))
+
+
+def _stream_label(source, position):
+    # 'File' of a .spold file given as bytes or an open file, its name when it has one
+    name = getattr(source, 'name', None)
+    return name if isinstance(name, str) else f"stream-{position}.spold"
+
+
+def _extract_file(file_path, source, dataset_id, streaming, cache):
+    hits = cache.hits if cache is not None else 0
+    try:
+        if cache is not None:
+            info, df_intermediate, df_elementary = cache.extract(source, streaming=streaming)
+        else:
+            info, df_intermediate, df_elementary = EcoSpoldProcessor(source, streaming=streaming).extract_all()
+    except Exception as error:
+        # One malformed file must not kill the whole run
+        count('files_failed')
+        return {'Dataset ID': dataset_id, 'File': file_path, 'Error': f"{type(error).__name__}: {error}"}
+
+    return {
+        'Dataset ID': dataset_id,
+        'File': file_path,
+        'Info': info,
+        'Intermediate': df_intermediate,
+        'Elementary': df_elementary,
+        'Cache Hit': cache is not None and cache.hits > hits,
+    }
+
+
+def _extract_chunk(items, streaming, cache_options=None, instrumentation_options=None):
+    # items are (file label, path or bytes) pairs
+    results = []
+    cache = SpoldCache(**cache_options) if cache_options is not None else None
+
+    # Worker processes record into memory, the records travel back with the results
+    sink = None
+    if instrumentation_options is not None:
+        sink = MemorySink()
+        enable_instrumentation(sink, **instrumentation_options)
+
+    try:
+        for file_path, source in items:
+            dataset_id = os.path.splitext(os.path.basename(file_path))[0]
+            first_record = len(sink.records) if sink is not None else 0
+            with file_scope(dataset_id):
+                result = _extract_file(file_path, source, dataset_id, streaming, cache)
+            if sink is not None:
+                result['Instrumentation'] = sink.records[first_record:]
+            results.append(result)
+    finally:
+        if sink is not None:
+            disable_instrumentation()
+
+    return results
+
+
+class EcoSpoldDatabaseExtractor:
+    def __init__(self, source, max_workers=None, chunk_size=64, streaming=False,
+                 cache_dir=None, cache_max_bytes=2 * 1024 ** 3, cache_format='parquet', mp_context=None):
+        """
+        Extracts every .spold file of a directory, glob pattern, file list or zip/tar archive
+        (a path or an open, seekable file) over a process pool. Files are sent to the workers
+        in chunks of chunk_size, with at most two chunks per worker in flight; max_workers=1
+        runs in-process. Archive members are read in one sequential pass and sent to the
+        workers as bytes, nothing is unpacked; the members of a tar archive are only known (in
+        self.files) once that pass is done. Files listed as bytes or open files are read here
+        in the given order and sent as bytes as well.
+        With cache_dir set, extractions are served from a SpoldCache when the file content
+        is unchanged, and the hit/miss counts of the last run are kept in self.cache_stats.
+        mp_context is the multiprocessing context of the pool, e.g. 'forkserver' or 'spawn'
+        when other threads are running (forking a multi-threaded process is unsafe).
+        """
+        self.source = source
+        self.archive = SpoldArchive(source) if is_archive(source) else None
+        # Listing a tar archive decompresses all of it, its members are taken from the extraction pass
+        self.files = find_spold_files(source) if self.archive is None or self.archive.is_zip else None
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.streaming = streaming
+        self.mp_context = multiprocessing.get_context(mp_context) if isinstance(mp_context, str) else mp_context
+        self.errors = pd.DataFrame(columns=['Dataset ID', 'File', 'Error'])
+        self.cache_options = None
+        if cache_dir is not None:
+            # Workers only store entries, the cache is evicted once at the end of extract()
+            self.cache_options = {'cache_dir': cache_dir, 'max_bytes': cache_max_bytes, 'table_format': cache_format,
+                                  'evict_on_put': False}
+        self.cache_stats = {'hits': 0, 'misses': 0}
+
+    def _chunks(self):
+        # Lazily, so archive members are only read when their chunk is submitted
+        if self.archive is None:
+            items = (self._file_item(position, file_path) for position, file_path in enumerate(self.files))
+        elif self.archive.is_zip:
+            items = ((self.archive.label(member), data) for member, data in self.archive.iter_members(self.files))
+        else:
+            self.files = []
+            items = self._tar_items()
+
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _file_item(position, file_path):
+        if isinstance(file_path, (str, os.PathLike)):
+            return file_path, file_path
+        # Open files cannot be sent to the workers, their content is
+        with open_spold_source(file_path) as f:
+            return _stream_label(file_path, position), f.read()
+
+    def _tar_items(self):
+        for member, data in self.archive.iter_members():
+            self.files.append(member)
+            yield self.archive.label(member), data
+
+    def _iter_results(self):
+        if self.max_workers == 1:
+            for chunk in self._chunks():
+                yield from _extract_chunk(chunk, self.streaming, self.cache_options)
+            return
+
+        instrumentation = get_instrumentation()
+        instrumentation_options = None
+        if instrumentation is not None:
+            instrumentation_options = {'track_memory': instrumentation.track_memory}
+
+        max_workers = self.max_workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=self.mp_context) as executor:
+            # Bounded submission keeps memory flat however large the source is
+            max_pending = 2 * max_workers
+            pending = deque()
+            chunks = self._chunks()
+            while True:
+                for chunk in chunks:
+                    pending.append(executor.submit(_extract_chunk, chunk, self.streaming, self.cache_options,
+                                                   instrumentation_options))
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+
+                for result in pending.popleft().result():
+                    for record in result.pop('Instrumentation', ()):
+                        if instrumentation is not None:
+                            instrumentation.record(record)
+                    yield result
+
+    def _iter_datasets(self):
+        # (info, df_intermediate, df_elementary) per parsed file, failures end up in self.errors
+        errors = []
+        self.cache_stats = {'hits': 0, 'misses': 0}
+
+        for result in self._iter_results():
+            if 'Error' in result:
+                errors.append(result)
+                continue
+
+            if self.cache_options is not None:
+                self.cache_stats['hits' if result['Cache Hit'] else 'misses'] += 1
+
+            dataset_id = result['Dataset ID']
+            activity_id = result['Info'].get('Activity ID')
+            info = {'Dataset ID': dataset_id, 'File': result['File'], **result['Info']}
+            yield (info,
+                   self._keyed(result['Intermediate'], dataset_id, activity_id),
+                   self._keyed(result['Elementary'], dataset_id, activity_id))
+
+        self.errors = pd.DataFrame(errors, columns=['Dataset ID', 'File', 'Error'])
+        if self.cache_options is not None:
+            SpoldCache(**self.cache_options).evict()
+
+    def extract(self, writer=None):
+        """
+        Returns (df_info, df_intermediate, df_elementary), each keyed by Dataset ID and
+        Activity ID. Files that failed to parse are listed in self.errors.
+        With a table writer (see table_writers), exchange tables are appended to it file by
+        file instead of being held in memory, and empty exchange tables are returned.
+        """
+        infos, intermediates, elementaries = [], [], []
+
+        for info, df_intermediate, df_elementary in self._iter_datasets():
+            infos.append(info)
+            if writer is not None:
+                with file_scope(info['Dataset ID']):
+                    writer.write('intermediate_exchanges', df_intermediate, dataset=info['Dataset ID'])
+                    writer.write('elementary_exchanges', df_elementary, dataset=info['Dataset ID'])
+            else:
+                intermediates.append(df_intermediate)
+                elementaries.append(df_elementary)
+
+        return self._stacked(infos, intermediates, elementaries)
+
+    def iter_batches(self, batch_size=16):
+        """
+        Yields (df_info, df_intermediate, df_elementary) for every batch_size parsed files, in
+        the same stacked, keyed form as extract(), so a whole database can be processed batch
+        by batch (see the batched processor methods). self.errors is set once exhausted.
+        """
+        batch = []
+        for dataset in self._iter_datasets():
+            batch.append(dataset)
+            if len(batch) == batch_size:
+                yield self._stacked(*zip(*batch))
+                batch = []
+        if batch:
+            yield self._stacked(*zip(*batch))
+
+    @staticmethod
+    def _stacked(infos, intermediates, elementaries):
+        df_info = pd.json_normalize(list(infos), sep=' ') if infos else pd.DataFrame()
+        df_intermediate = pd.concat(intermediates, ignore_index=True) if intermediates else pd.DataFrame()
+        df_elementary = pd.concat(elementaries, ignore_index=True) if elementaries else pd.DataFrame()
+
+        return df_info, df_intermediate, df_elementary
+
+    @staticmethod
+    def _keyed(df, dataset_id, activity_id):
+        df.insert(0, 'Activity ID', activity_id)
+        df.insert(0, 'Dataset ID', dataset_id)
+        return df
+
+# Usage example
+# extractor = EcoSpoldDatabaseExtractor(r"C:\my\path\to\ecoinvent\datasets", max_workers=8)
+# df_info, df_intermediate, df_elementary = extractor.extract()
+# print(extractor.errors)
+# Or batch by batch, e.g. for databases larger than memory
+# for df_info, df_intermediate, df_elementary in extractor.iter_batches(batch_size=64):
+#     ...
+# print(extractor.cache_stats)  # with cache_dir=... set
@@ -1,177 +1,485 @@
+import io
+import math
 import os
+import numpy as np
 import pandas as pd
 import xml.etree.ElementTree as ET
+from contextlib import nullcontext
+
+from .instrumentation import count, stage, timed
+from .table_writers import ExcelTableWriter
+
+# Bump whenever the extracted tables change, this invalidates cached extractions
+EXTRACTOR_VERSION = 4
+
+ECOSPOLD_NS = 'http://www.EcoInvent.org/EcoSpold02'
+INTERMEDIATE_TAG = f'{{{ECOSPOLD_NS}}}intermediateExchange'
+ELEMENTARY_TAG = f'{{{ECOSPOLD_NS}}}elementaryExchange'
+NAME_TAG = f'{{{ECOSPOLD_NS}}}name'
+UNIT_NAME_TAG = f'{{{ECOSPOLD_NS}}}unitName'
+COMMENT_TAG = f'{{{ECOSPOLD_NS}}}comment'
+PROPERTY_TAG = f'{{{ECOSPOLD_NS}}}property'
+UNCERTAINTY_TAG = f'{{{ECOSPOLD_NS}}}uncertainty'
+LOGNORMAL_TAG = f'{{{ECOSPOLD_NS}}}lognormal'
+COMPARTMENT_TAG = f'{{{ECOSPOLD_NS}}}compartment'
+SUBCOMPARTMENT_TAG = f'{{{ECOSPOLD_NS}}}subcompartment'
+CLASSIFICATION_TAG = f'{{{ECOSPOLD_NS}}}classification'
+CLASSIFICATION_VALUE_TAG = f'{{{ECOSPOLD_NS}}}classificationValue'
+GEOGRAPHY_TAG = f'{{{ECOSPOLD_NS}}}geography'
+SHORTNAME_TAG = f'{{{ECOSPOLD_NS}}}shortname'
+INPUT_GROUP_TAG = f'{{{ECOSPOLD_NS}}}inputGroup'
+OUTPUT_GROUP_TAG = f'{{{ECOSPOLD_NS}}}outputGroup'
+FLOW_DATA_TAG = f'{{{ECOSPOLD_NS}}}flowData'
+ACTIVITY_DESCRIPTION_TAG = f'{{{ECOSPOLD_NS}}}activityDescription'
+EXCHANGE_TYPES = {INTERMEDIATE_TAG: "intermediate", ELEMENTARY_TAG: "elementary"}
+
+
+EXCHANGE_COLUMNS = ['ID', 'Name', 'Amount', 'Unit', 'Comment', 'Compartment', 'Subcompartment',
+                    'Uncertainty Mean Value', 'Uncertainty Variance', 'Flow Type', 'Group Number']
+INTERMEDIATE_LINK_COLUMNS = ['Product ID', 'Activity Link ID']
+# Typed columns of the exchange tables, every other base column stays text
+FLOAT_COLUMNS = {'Amount'}
+CATEGORICAL_COLUMNS = {'Name', 'Unit', 'Compartment', 'Subcompartment', 'Flow Type', 'Group Number'}
+FLOW_TYPES = ["Input", "Output", "Unknown"]
+
+
+def exchange_columns(exchange_type):
+    if exchange_type == "intermediate":
+        return EXCHANGE_COLUMNS + INTERMEDIATE_LINK_COLUMNS
+    return EXCHANGE_COLUMNS
+
+
+def _float_array(values):
+    # Correctly rounded parsing, None and non-numeric text become NaN
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        parsed = []
+        for value in values:
+            try:
+                parsed.append(float(value))
+            except (TypeError, ValueError):
+                parsed.append(math.nan)
+        return np.array(parsed, dtype=np.float64)
+
+
+class ExchangeTableBuilder:
+    def __init__(self, exchange_type):
+        """
+        Builds an exchange table column by column. Each exchange appends its raw values to
+        per-column buffers, property columns being added as they are first seen (in that
+        order). build() types every column once: float64 for amounts and properties (NaN
+        when missing or not a number), sorted categoricals for names, units, compartments,
+        flow types and groups, so no dtype inference or later coercion pass is needed.
+        """
+        self.columns = exchange_columns(exchange_type)
+        self.rows = 0
+        self._buffers = {col: [] for col in self.columns}
+        self._appenders = [self._buffers[col].append for col in self.columns]
+        self._properties = {}
+
+    def append(self, values, properties=()):
+        for append_value, value in zip(self._appenders, values):
+            append_value(value)
+
+        for key, value in properties:
+            column = self._properties.get(key)
+            if column is None:
+                column = self._properties[key] = [None] * self.rows
+            elif len(column) > self.rows:
+                # Repeated property in one exchange, the last one wins as in a dict
+                column[-1] = value
+                continue
+            elif len(column) < self.rows:
+                column.extend([None] * (self.rows - len(column)))
+            column.append(value)
+        self.rows += 1
+
+    def __len__(self):
+        return self.rows
+
+    def build(self):
+        if self.rows == 0:
+            return pd.DataFrame()
+
+        data = {}
+        for col in self.columns:
+            values = self._buffers[col]
+            if col in FLOAT_COLUMNS:
+                data[col] = _float_array(values)
+            elif col == 'Flow Type':
+                data[col] = pd.Categorical(values, categories=FLOW_TYPES)
+            elif col in CATEGORICAL_COLUMNS:
+                # Sorted categories, so groupby and sort_values order labels as plain strings
+                data[col] = pd.Categorical(values)
+            else:
+                data[col] = values
+        for key, column in self._properties.items():
+            if len(column) < self.rows:
+                column.extend([None] * (self.rows - len(column)))
+            data[key] = _float_array(column)
+
+        return pd.DataFrame(data)
+
+
+def numeric_column(series):
+    # Columns of the typed tables are float already, only text columns need parsing
+    if pd.api.types.is_float_dtype(series):
+        return series
+    return pd.to_numeric(series, errors='coerce')
+
+
+def open_spold_source(source):
+    """
+    Returns a binary file object for a path, bytes (e.g. an archive member) or an open
+    binary file, for use in a with block; only files opened here are closed by it.
+    Open files are rewound first when they can be, so they may be read several times.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    if hasattr(source, 'read'):
+        if source.seekable():
+            source.seek(0)
+        return nullcontext(source)
+    return open(source, 'rb')
+
+
+def rewindable_spold_source(source):
+    """
+    Returns source, or the bytes of a non-seekable file object (a pipe, a socket, a tar
+    stream member), read once so the source can be parsed and hashed several times.
+    """
+    if hasattr(source, 'read') and not source.seekable():
+        return source.read()
+    return source
+
 
 class EcoSpoldProcessor:
-    def __init__(self, file_path):
-        self.file_path = file_path
-        self.tree = ET.parse(file_path)
-        self.root = self.tree.getroot()
-        self.namespaces = {'ns': 'http://www.EcoInvent.org/EcoSpold02'}
+    def __init__(self, file_path, streaming=False):
+        """
+        file_path may also be the bytes of a .spold file or an open binary file object;
+        non-seekable ones are read into memory once, since streaming mode reads the source
+        again on each pass. With streaming=True the file is never loaded as a full tree:
+        exchanges are parsed incrementally with iterparse and discarded once their record
+        is built.
+        """
+        self.file_path = rewindable_spold_source(file_path)
+        self.streaming = streaming
+        self.namespaces = {'ns': ECOSPOLD_NS}
+        self.general_info = None
+        if streaming:
+            self.tree = None
+            self.root = None
+        else:
+            with stage('extraction.parse'):
+                with open_spold_source(self.file_path) as source:
+                    self.tree = ET.parse(source)
+            self.root = self.tree.getroot()
 
     def extract_general_info(self):
+        if self.streaming:
+            # Header fields precede the first intermediate exchange, stop reading there
+            if self.general_info is None:
+                for _ in self.iter_exchanges():
+                    if self.general_info is not None:
+                        break
+            return self.general_info
+
+        return self._general_info(self.root, self.root.find('.//ns:intermediateExchange', self.namespaces))
+
+    def _general_info(self, root, intermediate_exchange):
         info = {}
 
+        # Header fields all live in activityDescription, no need to search the exchanges
+        description = root.find('./*/ns:activityDescription', self.namespaces)
+        if description is not None:
+            root = description
+
         # Activity Name
-        info['Activity Name'] = self.root.find('.//ns:activityName', self.namespaces).text
+        info['Activity Name'] = root.find('.//ns:activityName', self.namespaces).text
+
+        # Activity ID
+        activity = root.find('.//ns:activity', self.namespaces)
+        info['Activity ID'] = activity.get('id') if activity is not None else None
 
         # General Comment
-        general_comment = self.root.findall('.//ns:generalComment/ns:text', self.namespaces)
+        general_comment = root.findall('.//ns:generalComment/ns:text', self.namespaces)
         info['General Comment'] = [comment.text for comment in general_comment]
 
         # Geography
-        info['Geography'] = self.root.find('.//ns:geography/ns:shortname', self.namespaces).text
+        info['Geography'] = root.find('.//ns:geography/ns:shortname', self.namespaces).text
 
         # Technology Comment
-        info['Technology Comment'] = self.root.find('.//ns:technology/ns:comment/ns:text', self.namespaces).text
+        info['Technology Comment'] = root.find('.//ns:technology/ns:comment/ns:text', self.namespaces).text
 
         # Time Period
-        time_period = self.root.find('.//ns:timePeriod', self.namespaces)
+        time_period = root.find('.//ns:timePeriod', self.namespaces)
         info['Start Date'] = time_period.get('startDate')
         info['End Date'] = time_period.get('endDate')
         info['Is Valid Entire Period'] = time_period.get('isDataValidForEntirePeriod')
         info['Time Comments'] = [comment.text for comment in time_period.findall('.//ns:comment/ns:text', self.namespaces)]
 
         # Macroeconomic Scenario
-        macro_scenario = self.root.find('.//ns:macroEconomicScenario', self.namespaces)
+        macro_scenario = root.find('.//ns:macroEconomicScenario', self.namespaces)
         info['Macro Scenario'] = macro_scenario.find('.//ns:name', self.namespaces).text
 
-        # Reference Product (First Intermediate Exchange)
-        intermediate_exchange = self.root.find('.//ns:intermediateExchange', self.namespaces)
+        # Reference Product (First Intermediate Exchange), read like the exchange records
         if intermediate_exchange is not None:
+            reference = self._exchange_record(intermediate_exchange, "intermediate")
             info['Reference Product'] = {
-                'Name': intermediate_exchange.find('.//ns:name', self.namespaces).text,
-                'Amount': intermediate_exchange.get('amount'),
-                'Unit': intermediate_exchange.find('.//ns:unitName', self.namespaces).text,
-                'Comment': intermediate_exchange.find('.//ns:comment', self.namespaces).text
+                'Name': reference['Name'],
+                'Amount': reference['Amount'],
+                'Unit': reference['Unit'],
+                'Comment': reference['Comment']
             }
-            # Properties of the reference
-            properties = intermediate_exchange.findall('.//ns:property', self.namespaces)
+            # Properties of the reference, direct children only
+            properties = intermediate_exchange.findall('ns:property', self.namespaces)
             info['Reference Properties'] = [
                 {
-                    'Name': prop.find('.//ns:name', self.namespaces).text,
+                    'Name': prop.findtext('ns:name', namespaces=self.namespaces),
                     'Amount': prop.get('amount'),
-                    'Unit': prop.find('.//ns:unitName', self.namespaces).text
+                    'Unit': prop.findtext('ns:unitName', namespaces=self.namespaces)
                 }
                 for prop in properties
             ]
 
         return info
 
+    def _iter_exchange_elements(self):
+        """
+        Streams (exchange_type, element) tuples as each exchange element closes.
+        Finished exchanges and every other child of flowData (e.g. parameters) are cleared
+        and detached once consumed, as are the sections after flowData, so memory stays
+        bounded by one exchange; general info is filled in once the first intermediate
+        exchange closes.
+        """
+        with open_spold_source(self.file_path) as source:
+            root = None
+            parents = []
+            general_info_done = self.general_info is not None
+            for event, elem in ET.iterparse(source, events=('start', 'end')):
+                if event == 'start':
+                    if root is None:
+                        root = elem
+                    parents.append(elem)
+                    continue
+
+                parents.pop()
+                exchange_type = EXCHANGE_TYPES.get(elem.tag)
+                if exchange_type is not None:
+                    if not general_info_done and exchange_type == "intermediate":
+                        self.general_info = self._general_info(root, elem)
+                        general_info_done = True
+                    yield exchange_type, elem
+                elif not parents:
+                    continue
+                elif parents[-1].tag != FLOW_DATA_TAG and (len(parents) != 2 or elem.tag == ACTIVITY_DESCRIPTION_TAG):
+                    # Nested elements go with their section, activityDescription holds the general info
+                    continue
+
+                elem.clear()
+                if parents:
+                    parents[-1].remove(elem)
+
+            if not general_info_done and root is not None:
+                self.general_info = self._general_info(root, None)
+
+    def iter_exchanges(self):
+        """
+        Streams (exchange_type, record) tuples, one dict per exchange with the raw attribute text.
+        """
+        for exchange_type, exchange in self._iter_exchange_elements():
+            yield exchange_type, self._exchange_record(exchange, exchange_type)
+
+    @timed('extraction.extract_exchanges')
     def extract_exchanges(self, exchange_type):
-        if exchange_type == "intermediate":
-            exchanges = self.root.findall('.//ns:intermediateExchange', self.namespaces)
-        elif exchange_type == "elementary":
-            exchanges = self.root.findall('.//ns:elementaryExchange', self.namespaces)
-        else:
+        if exchange_type not in ("intermediate", "elementary"):
             raise ValueError("Invalid exchange type. Use 'intermediate' or 'elementary'.")
 
-        exchange_data = []
+        builder = ExchangeTableBuilder(exchange_type)
+        if self.streaming:
+            for record_type, exchange in self._iter_exchange_elements():
+                if record_type == exchange_type:
+                    builder.append(*self._exchange_fields(exchange, exchange_type))
+        else:
+            if exchange_type == "intermediate":
+                exchanges = self.root.findall('.//ns:intermediateExchange', self.namespaces)
+            else:
+                exchanges = self.root.findall('.//ns:elementaryExchange', self.namespaces)
+            for exchange in exchanges:
+                builder.append(*self._exchange_fields(exchange, exchange_type))
 
-        for exchange in exchanges:
-            exchange_dict = {
-                'ID': exchange.get('id'),
-                'Name': exchange.find('.//ns:name', self.namespaces).text,
-                'Amount': exchange.get('amount'),
-                'Unit': exchange.find('.//ns:unitName', self.namespaces).text,
-                'Comment': exchange.find('.//ns:comment', self.namespaces).text if exchange.find('.//ns:comment', self.namespaces) is not None else "No comment"
-            }
+        count(f'exchanges_parsed.{exchange_type}', len(builder))
+        return builder.build()
 
-            # Compartment
-            if exchange_type == "elementary":
-                # Elementary flows have standard compartment info
-                compartment = exchange.find('.//ns:compartment', self.namespaces)
-                exchange_dict['Compartment'] = compartment.find('.//ns:compartment', self.namespaces).text if compartment is not None else "No compartment"
-                exchange_dict['Subcompartment'] = compartment.find('.//ns:subcompartment', self.namespaces).text if compartment is not None else "No subcompartment"
-            else:
-                # Intermediate flows - use classification and geography
-                classification = exchange.find('.//ns:classification/ns:classificationValue', self.namespaces)
-                exchange_dict['Compartment'] = classification.text if classification is not None else "Technosphere"
-
-                # Get geography as subcompartment
-                geography = exchange.find('.//ns:geography/ns:shortname', self.namespaces)
-                exchange_dict['Subcompartment'] = geography.text if geography is not None else "No subcompartment"
-
-            # Uncertainty
-            uncertainty = exchange.find('.//ns:uncertainty', self.namespaces)
-            if uncertainty is not None:
-                lognormal = uncertainty.find('.//ns:lognormal', self.namespaces)
-                exchange_dict['Uncertainty Mean Value'] = lognormal.get('meanValue') if lognormal is not None else "No mean value"
-                exchange_dict['Uncertainty Variance'] = lognormal.get('variance') if lognormal is not None else "No variance"
-            else:
-                exchange_dict['Uncertainty Mean Value'] = "No uncertainty"
-                exchange_dict['Uncertainty Variance'] = "No uncertainty"
-
-            # Flow Type and Group
-            input_group = exchange.find('.//ns:inputGroup', self.namespaces)
-            output_group = exchange.find('.//ns:outputGroup', self.namespaces)
-            if input_group is not None:
-                exchange_dict['Flow Type'] = "Input"
-                exchange_dict['Group Number'] = input_group.text
-            elif output_group is not None:
-                exchange_dict['Flow Type'] = "Output"
-                exchange_dict['Group Number'] = output_group.text
-            else:
-                exchange_dict['Flow Type'] = "Unknown"
-                exchange_dict['Group Number'] = "No group"
+    def _exchange_fields(self, exchange, exchange_type):
+        """
+        Returns the values of exchange_columns(exchange_type) and the (property, amount)
+        pairs of one exchange, as raw attribute text.
+        """
+        # Single pass over the direct children, routed by tag
+        name = unit = comment = None
+        compartment = subcompartment = classification = geography = None
+        mean_value = variance = "No uncertainty"
+        input_group = output_group = None
+        properties = []
+
+        for child in exchange:
+            tag = child.tag
+            if tag == NAME_TAG:
+                name = child.text
+            elif tag == UNIT_NAME_TAG:
+                unit = child.text
+            elif tag == COMMENT_TAG:
+                if comment is None:
+                    comment = child
+            elif tag == PROPERTY_TAG:
+                prop_name = prop_unit = None
+                for prop_child in child:
+                    if prop_child.tag == NAME_TAG:
+                        prop_name = prop_child.text
+                    elif prop_child.tag == UNIT_NAME_TAG:
+                        prop_unit = prop_child.text
+                properties.append((f"{prop_name} ({prop_unit})", child.get('amount')))
+            elif tag == UNCERTAINTY_TAG:
+                lognormal = child.find(LOGNORMAL_TAG)
+                mean_value = lognormal.get('meanValue') if lognormal is not None else "No mean value"
+                variance = lognormal.get('variance') if lognormal is not None else "No variance"
+            elif tag == COMPARTMENT_TAG:
+                for compartment_child in child:
+                    if compartment_child.tag == COMPARTMENT_TAG:
+                        compartment = compartment_child.text
+                    elif compartment_child.tag == SUBCOMPARTMENT_TAG:
+                        subcompartment = compartment_child.text
+            elif tag == CLASSIFICATION_TAG:
+                if classification is None:
+                    classification = child.find(CLASSIFICATION_VALUE_TAG)
+            elif tag == GEOGRAPHY_TAG:
+                geography = child.find(SHORTNAME_TAG)
+            elif tag == INPUT_GROUP_TAG:
+                input_group = child.text
+            elif tag == OUTPUT_GROUP_TAG:
+                output_group = child.text
+
+        # Compartment
+        if exchange_type == "elementary":
+            # Elementary flows have standard compartment info
+            compartment = compartment if compartment is not None else "No compartment"
+            subcompartment = subcompartment if subcompartment is not None else "No subcompartment"
+        else:
+            # Intermediate flows - use classification and geography as subcompartment
+            compartment = classification.text if classification is not None else "Technosphere"
+            subcompartment = geography.text if geography is not None else "No subcompartment"
+
+        # Flow Type and Group
+        if input_group is not None:
+            flow_type, group = "Input", input_group
+        elif output_group is not None:
+            flow_type, group = "Output", output_group
+        else:
+            flow_type, group = "Unknown", "No group"
+
+        values = [
+            exchange.get('id'),
+            name,
+            exchange.get('amount'),
+            unit,
+            comment.text if comment is not None else "No comment",
+            compartment,
+            subcompartment,
+            mean_value,
+            variance,
+            flow_type,
+            group,
+        ]
+
+        # Supply chain links: the product exchanged and the activity supplying it
+        if exchange_type == "intermediate":
+            values.append(exchange.get('intermediateExchangeId'))
+            values.append(exchange.get('activityLinkId'))
 
-            # Properties
-            properties = exchange.findall('.//ns:property', self.namespaces)
-            for prop in properties:
-                prop_name = prop.find('.//ns:name', self.namespaces).text
-                prop_amount = prop.get('amount')
-                prop_unit = prop.find('.//ns:unitName', self.namespaces).text
-                exchange_dict[f"{prop_name} ({prop_unit})"] = prop_amount
+        return values, properties
 
-            exchange_data.append(exchange_dict)
+    def _exchange_record(self, exchange, exchange_type):
+        values, properties = self._exchange_fields(exchange, exchange_type)
+        exchange_dict = dict(zip(exchange_columns(exchange_type), values))
+        exchange_dict.update(properties)
+        return exchange_dict
 
-        return pd.DataFrame(exchange_data)
+    @timed('extraction.extract_all')
+    def extract_all(self):
+        """
+        Extracts general info and both exchange tables in one traversal.
+        Returns (info, df_intermediate, df_elementary).
+        """
+        builders = {"intermediate": ExchangeTableBuilder("intermediate"),
+                    "elementary": ExchangeTableBuilder("elementary")}
 
+        if self.streaming:
+            for exchange_type, exchange in self._iter_exchange_elements():
+                builders[exchange_type].append(*self._exchange_fields(exchange, exchange_type))
+            info = self.general_info
+        else:
+            first_intermediate = None
+            flow_data = self.root.find('./*/ns:flowData', self.namespaces)
+            for exchange in (flow_data if flow_data is not None else ()):
+                exchange_type = EXCHANGE_TYPES.get(exchange.tag)
+                if exchange_type is None:
+                    continue
+                if first_intermediate is None and exchange_type == "intermediate":
+                    first_intermediate = exchange
+                builders[exchange_type].append(*self._exchange_fields(exchange, exchange_type))
+            info = self._general_info(self.root, first_intermediate)
+
+        count('exchanges_parsed.intermediate', len(builders["intermediate"]))
+        count('exchanges_parsed.elementary', len(builders["elementary"]))
+        return info, builders["intermediate"].build(), builders["elementary"].build()
+
+    @timed('extraction.convert_numerical_columns')
     def convert_numerical_columns(self, df_intermediate, df_elementary):
         """
         Converts numeric-like columns in the DataFrames to proper numerical format (floats).
         """
         # Intermediate: convert Amount and dry mass
         if 'Amount' in df_intermediate.columns:
-            df_intermediate['Amount'] = pd.to_numeric(df_intermediate['Amount'], errors='coerce').fillna(0)
+            df_intermediate['Amount'] = numeric_column(df_intermediate['Amount']).fillna(0)
         if 'dry mass (kg)' in df_intermediate.columns:
-            df_intermediate['dry mass (kg)'] = pd.to_numeric(df_intermediate['dry mass (kg)'], errors='coerce').fillna(0)
+            df_intermediate['dry mass (kg)'] = numeric_column(df_intermediate['dry mass (kg)']).fillna(0)
 
         # Intermediate: convert all dimensionless properties
         for col in df_intermediate.columns:
             if '(dimensionless)' in col:
-                df_intermediate[col] = pd.to_numeric(df_intermediate[col], errors='coerce').fillna(0)
+                df_intermediate[col] = numeric_column(df_intermediate[col]).fillna(0)
 
         # Elementary: convert Amount
         if 'Amount' in df_elementary.columns:
-            df_elementary['Amount'] = pd.to_numeric(df_elementary['Amount'], errors='coerce').fillna(0)
+            df_elementary['Amount'] = numeric_column(df_elementary['Amount']).fillna(0)
 
         return df_intermediate, df_elementary
 
-    def save_to_excel(self, output_file):
-        df_intermediate = self.extract_exchanges("intermediate")
-        df_elementary = self.extract_exchanges("elementary")
-
-        # Convert numeric columns before saving
+    @timed('export.write_tables')
+    def write_tables(self, writer, dataset=None):
+        """
+        Writes both exchange tables to a table writer (see table_writers), e.g. Parquet.
+        """
+        _, df_intermediate, df_elementary = self.extract_all()
         df_intermediate, df_elementary = self.convert_numerical_columns(df_intermediate, df_elementary)
 
-        with pd.ExcelWriter(output_file, engine='openpyxl', mode='w') as writer:
-            df_intermediate.to_excel(writer, sheet_name='intermediate_exchanges', index=False)
-            df_elementary.to_excel(writer, sheet_name='elementary_exchanges', index=False)
+        writer.write('intermediate_exchanges', df_intermediate, dataset=dataset)
+        writer.write('elementary_exchanges', df_elementary, dataset=dataset)
 
-        print(f"DataFrame saved to: {os.path.abspath(output_file)}")
-
-# Usage
-spold_path = r"C:\my\path\to\the\ecoinvent_unit-process.spold"
-processor = EcoSpoldProcessor(spold_path)
-
-# General Info Extraction
-general_info = processor.extract_general_info()
-# print(general_info)
+    @timed('export.excel')
+    def save_to_excel(self, output_file):
+        # Write-only workbook, for manual review of a single dataset
+        with ExcelTableWriter(output_file) as writer:
+            self.write_tables(writer)
 
-# Exchange Data Extraction
-df_intermediate = processor.extract_exchanges("intermediate")
-df_elementary = processor.extract_exchanges("elementary")
+        print(f"DataFrame saved to: {os.path.abspath(output_file)}")
 
+# Usage example
+# processor = EcoSpoldProcessor(r"C:\my\path\to\the\ecoinvent_unit-process.spold")
+# general_info = processor.extract_general_info()
+# df_intermediate = processor.extract_exchanges("intermediate")
+# df_elementary = processor.extract_exchanges("elementary")
 # Save all to an Excel File for Manual treatment
-extractor.save_to_excel("unit-process_name.xlsx")
+# processor.save_to_excel("unit-process_name.xlsx")
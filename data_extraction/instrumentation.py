@@ -0,0 +1,232 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+import pandas as pd
+
+# Active Instrumentation of this process, None when disabled
+_active = None
+_NULL_CONTEXT = nullcontext()
+
+
+class MemorySink:
+    # Keeps every record in memory, e.g. for a notebook session
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def to_frame(self):
+        return pd.DataFrame(self.records)
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink:
+    # Appends one JSON object per record to a file
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def emit(self, record):
+        if self._file is None:
+            # Line buffered, so forked workers never inherit half-written records
+            self._file = open(self.path, 'a', encoding='utf-8', buffering=1)
+        self._file.write(json.dumps(record) + '\n')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class Instrumentation:
+    def __init__(self, sink=None, track_memory=False):
+        """
+        Collects wall time (and peak traced memory with track_memory=True) per stage and per
+        file, plus named counters. Every record is sent to the sink as a dict; totals are
+        kept in self.stages and self.counters. tracemalloc slows allocations down noticeably,
+        so memory tracking is opt-in. Stages may run on several threads (see Pipeline); their
+        peaks then include what the other threads allocate meanwhile.
+        """
+        self.sink = sink if sink is not None else MemorySink()
+        self.track_memory = track_memory
+        self.stages = {}
+        self.counters = {}
+        self.pid = os.getpid()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+
+    @property
+    def file(self):
+        # File (dataset) tag of the records made by the current thread
+        return getattr(self._local, 'file', None)
+
+    @file.setter
+    def file(self, file):
+        self._local.file = file
+
+    @property
+    def _memory_frames(self):
+        # One stack of open stages per thread
+        if not hasattr(self._local, 'memory_frames'):
+            self._local.memory_frames = []
+        return self._local.memory_frames
+
+    def start(self):
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def stop(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        self.sink.close()
+
+    @contextmanager
+    def stage(self, name):
+        tracking = self.track_memory and tracemalloc.is_tracing()
+        if tracking:
+            # Peaks nest: the enclosing stage keeps the highest peak seen by its children
+            current, peak = tracemalloc.get_traced_memory()
+            if self._memory_frames:
+                self._memory_frames[-1][1] = max(self._memory_frames[-1][1], peak)
+            tracemalloc.reset_peak()
+            self._memory_frames.append([current, current])
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak_bytes = None
+            if tracking:
+                _, peak = tracemalloc.get_traced_memory()
+                frame = self._memory_frames.pop()
+                frame[1] = max(frame[1], peak)
+                peak_bytes = frame[1] - frame[0]
+                if self._memory_frames:
+                    self._memory_frames[-1][1] = max(self._memory_frames[-1][1], frame[1])
+            self.record({'kind': 'stage', 'name': name, 'file': self.file, 'seconds': seconds,
+                         'peak_bytes': peak_bytes, 'pid': os.getpid()})
+
+    def count(self, name, value=1):
+        self.record({'kind': 'counter', 'name': name, 'file': self.file, 'value': int(value), 'pid': os.getpid()})
+
+    def record(self, record):
+        """
+        Adds a record to the totals and sends it to the sink, also used to replay the
+        records collected in worker processes.
+        """
+        with self._lock:
+            if record['kind'] == 'stage':
+                totals = self.stages.setdefault(record['name'], {'calls': 0, 'seconds': 0.0, 'peak_bytes': None})
+                totals['calls'] += 1
+                totals['seconds'] += record['seconds']
+                if record['peak_bytes'] is not None:
+                    totals['peak_bytes'] = max(totals['peak_bytes'] or 0, record['peak_bytes'])
+            else:
+                self.counters[record['name']] = self.counters.get(record['name'], 0) + record['value']
+            self.sink.emit(record)
+
+    def summary(self):
+        """
+        Returns the stage totals as a DataFrame, slowest stage first.
+        """
+        df = pd.DataFrame.from_dict(self.stages, orient='index')
+        if df.empty:
+            return df
+        return df.rename_axis('Stage').sort_values('seconds', ascending=False)
+
+
+def enable_instrumentation(sink=None, track_memory=False):
+    """
+    Starts reporting every pipeline stage of this process to sink, returns the Instrumentation.
+    """
+    global _active
+    disable_instrumentation()
+    _active = Instrumentation(sink, track_memory)
+    _active.start()
+    return _active
+
+
+def disable_instrumentation():
+    global _active
+    # An instrumentation inherited by a forked worker belongs to the parent, leave its sink alone
+    if _active is not None and _active.pid == os.getpid():
+        _active.stop()
+    _active = None
+
+
+def get_instrumentation():
+    return _active
+
+
+def is_enabled():
+    return _active is not None
+
+
+@contextmanager
+def instrumented(sink=None, track_memory=False):
+    instrumentation = enable_instrumentation(sink, track_memory)
+    try:
+        yield instrumentation
+    finally:
+        disable_instrumentation()
+
+
+def stage(name):
+    # A shared no-op context when disabled
+    if _active is None:
+        return _NULL_CONTEXT
+    return _active.stage(name)
+
+
+def count(name, value=1):
+    if _active is not None:
+        _active.count(name, value)
+
+
+@contextmanager
+def file_scope(file):
+    """
+    Tags the records made inside the block with a file (dataset) name.
+    """
+    if _active is None:
+        yield
+        return
+    previous, _active.file = _active.file, file
+    try:
+        yield
+    finally:
+        _active.file = previous
+
+
+def timed(name):
+    """
+    Decorator recording every call of the function as a stage; a plain call when disabled.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _active.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Usage example
+# with instrumented(JsonLinesSink("pipeline_profile.jsonl"), track_memory=True) as instrumentation:
+#     df_info, df_intermediate, df_elementary = EcoSpoldDatabaseExtractor(datasets_dir).extract()
+#     ...
+# print(instrumentation.summary())
+# print(instrumentation.counters)
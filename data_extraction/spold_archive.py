@@ -0,0 +1,99 @@
+import fnmatch
+import os
+import posixpath
+import tarfile
+import zipfile
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+def is_archive(source):
+    if hasattr(source, 'read'):
+        # Open archive files are recognised by their content, read from the start
+        if not source.seekable():
+            return False
+        source.seek(0)
+        if zipfile.is_zipfile(source):
+            return True
+        source.seek(0)
+        return tarfile.is_tarfile(source)
+    return isinstance(source, str) and source.lower().endswith(ARCHIVE_SUFFIXES) and os.path.isfile(source)
+
+
+class SpoldArchive:
+    def __init__(self, archive_path, pattern='*.spold'):
+        """
+        Reads .spold members straight out of a zip or tar release archive, without unpacking
+        it to disk. Members are returned as bytes, which EcoSpoldProcessor parses from memory.
+        archive_path may also be an open, seekable binary file of the archive (e.g. a BytesIO).
+        """
+        if not is_archive(archive_path):
+            raise ValueError(f"Not a zip or tar archive: {archive_path!r}.")
+        self.archive_path = archive_path
+        self.pattern = pattern
+        self.is_zip = zipfile.is_zipfile(archive_path)
+
+    def _matches(self, name):
+        return fnmatch.fnmatch(posixpath.basename(name), self.pattern)
+
+    def _open_tar(self, mode):
+        if hasattr(self.archive_path, 'read'):
+            self.archive_path.seek(0)
+            return tarfile.open(fileobj=self.archive_path, mode=mode)
+        return tarfile.open(self.archive_path, mode)
+
+    def members(self):
+        """
+        Returns the sorted names of the matching members.
+        """
+        if self.is_zip:
+            with zipfile.ZipFile(self.archive_path) as archive:
+                names = [info.filename for info in archive.infolist() if not info.is_dir()]
+        else:
+            with self._open_tar('r:*') as archive:
+                names = [member.name for member in archive if member.isfile()]
+        return sorted(name for name in names if self._matches(name))
+
+    def iter_members(self, members=None):
+        """
+        Yields (member name, bytes) for the matching members, or only for the given ones.
+        Zip members come in name order; tar archives are read once front to back, in
+        archive order, so compressed tarballs are never rewound.
+        """
+        wanted = set(members) if members is not None else None
+
+        if self.is_zip:
+            with zipfile.ZipFile(self.archive_path) as archive:
+                names = sorted(info.filename for info in archive.infolist() if not info.is_dir())
+                for name in names:
+                    if (name in wanted) if wanted is not None else self._matches(name):
+                        yield name, archive.read(name)
+            return
+
+        with self._open_tar('r|*') as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                if (member.name in wanted) if wanted is not None else self._matches(member.name):
+                    yield member.name, archive.extractfile(member).read()
+
+    def read(self, member):
+        """
+        Returns the bytes of one member; cheap for zip, a scan of the archive for tar.
+        """
+        for _, data in self.iter_members([member]):
+            return data
+        raise KeyError(member)
+
+    def label(self, member):
+        # Path-like name of a member, used as 'File' in the extracted tables
+        archive_name = self.archive_path
+        if hasattr(archive_name, 'read'):
+            archive_name = getattr(archive_name, 'name', None)
+            archive_name = archive_name if isinstance(archive_name, str) else '<archive>'
+        return os.path.join(archive_name, member)
+
+# Usage example
+# archive = SpoldArchive(r"C:\my\path\to\ecoinvent_3.10_cutoff_ecoSpold02.zip")
+# for member, data in archive.iter_members():
+#     info, df_intermediate, df_elementary = EcoSpoldProcessor(data).extract_all()
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import pandas as pd
+
+from .extract_ei_spold_data import EXTRACTOR_VERSION, EcoSpoldProcessor, open_spold_source, rewindable_spold_source
+from .instrumentation import count
+
+TABLE_FORMATS = {
+    'parquet': ('.parquet', pd.read_parquet, lambda df, path: df.to_parquet(path, index=False)),
+    'feather': ('.feather', pd.read_feather, lambda df, path: df.to_feather(path)),
+}
+
+
+class SpoldCache:
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3, table_format='parquet', evict_on_put=True):
+        """
+        Content-addressed cache of extracted .spold tables. Entries are keyed on the SHA-256
+        of the file content plus EXTRACTOR_VERSION, so renamed or copied files still hit and
+        changes to the extraction code invalidate everything. Least recently used entries are
+        evicted once the cache grows past max_bytes. With evict_on_put=False, put() neither
+        tracks the cache size nor evicts, and evict() is left to the caller, e.g. once at the
+        end of a batch run.
+        """
+        if table_format not in TABLE_FORMATS:
+            raise ValueError(f"Invalid table format. Use one of {list(TABLE_FORMATS)}.")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.table_format = table_format
+        self.evict_on_put = evict_on_put
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, file_path):
+        digest = hashlib.sha256(f"extractor-{EXTRACTOR_VERSION}\n".encode())
+        # Paths, bytes and open files hash the same for the same content
+        with open_spold_source(file_path) as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key):
+        """
+        Returns (info, df_intermediate, df_elementary) for a cached key, or None.
+        """
+        entry_dir = self._entry_dir(key)
+        extension, read_table, _ = TABLE_FORMATS[self.table_format]
+        try:
+            with open(os.path.join(entry_dir, 'info.json'), encoding='utf-8') as f:
+                info = json.load(f)
+            df_intermediate = read_table(os.path.join(entry_dir, 'intermediate' + extension))
+            df_elementary = read_table(os.path.join(entry_dir, 'elementary' + extension))
+            # Touch the entry, eviction removes the oldest mtimes first
+            os.utime(entry_dir)
+        except (OSError, ValueError):
+            # Missing, partially evicted or unreadable entries are plain misses, broken ones
+            # are removed so the next put() can store the entry again
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+        return info, df_intermediate, df_elementary
+
+    def put(self, key, info, df_intermediate, df_elementary):
+        entry_dir = self._entry_dir(key)
+        extension, _, write_table = TABLE_FORMATS[self.table_format]
+
+        # Write into a private directory first so concurrent workers never see half an entry
+        tmp_dir = os.path.join(self.cache_dir, 'tmp', uuid.uuid4().hex)
+        os.makedirs(tmp_dir)
+        with open(os.path.join(tmp_dir, 'info.json'), 'w', encoding='utf-8') as f:
+            json.dump(info, f)
+        write_table(df_intermediate, os.path.join(tmp_dir, 'intermediate' + extension))
+        write_table(df_elementary, os.path.join(tmp_dir, 'elementary' + extension))
+        entry_size = self._dir_size(tmp_dir)
+
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        if not self._is_complete(entry_dir):
+            # A broken entry in the way would make every replace fail
+            shutil.rmtree(entry_dir, ignore_errors=True)
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # Another process stored the same content first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        if self.evict_on_put and self.max_bytes is not None:
+            if self._size is None:
+                self._size = self.size()
+            else:
+                self._size += entry_size
+            if self._size > self.max_bytes:
+                self.evict()
+
+    def extract(self, file_path, streaming=False):
+        """
+        Returns (info, df_intermediate, df_elementary), parsing the file only on a cache miss.
+        """
+        # Hashing must not consume a stream the parser still needs
+        file_path = rewindable_spold_source(file_path)
+        key = self.key(file_path)
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            count('cache.hits')
+            return cached
+
+        self.misses += 1
+        count('cache.misses')
+        info, df_intermediate, df_elementary = EcoSpoldProcessor(file_path, streaming=streaming).extract_all()
+        self.put(key, info, df_intermediate, df_elementary)
+        return info, df_intermediate, df_elementary
+
+    def _entries(self):
+        for prefix in os.scandir(self.cache_dir):
+            if not prefix.is_dir() or prefix.name == 'tmp':
+                continue
+            for entry in os.scandir(prefix.path):
+                if entry.is_dir():
+                    yield entry
+
+    def _is_complete(self, entry_dir):
+        extension = TABLE_FORMATS[self.table_format][0]
+        return all(os.path.isfile(os.path.join(entry_dir, name))
+                   for name in ('info.json', 'intermediate' + extension, 'elementary' + extension))
+
+    @staticmethod
+    def _dir_size(path):
+        return sum(f.stat().st_size for f in os.scandir(path) if f.is_file())
+
+    def size(self):
+        return sum(self._dir_size(entry.path) for entry in self._entries())
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits in max_bytes.
+        """
+        entries = []
+        for entry in self._entries():
+            try:
+                entries.append((entry.stat().st_mtime, self._dir_size(entry.path), entry.path))
+            except OSError:
+                continue
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if self.max_bytes is None or total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+        self._size = total
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+# Usage example
+# cache = SpoldCache(r"C:\my\path\to\spold_cache", max_bytes=5 * 1024 ** 3)
+# info, df_intermediate, df_elementary = cache.extract(spold_path)
+# print(cache.stats())
@@ -0,0 +1,189 @@
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from .extract_ei_database import find_spold_files
+from .extract_ei_spold_data import EcoSpoldProcessor
+from .instrumentation import count
+from .spold_archive import is_archive
+
+# Bump whenever the catalog columns change, the catalog is then rebuilt from scratch
+CATALOG_VERSION = 1
+
+CATALOG_COLUMNS = {
+    'dataset_id': 'TEXT',
+    'activity_id': 'TEXT',
+    'activity_name': 'TEXT',
+    'geography': 'TEXT',
+    'start_date': 'TEXT',
+    'end_date': 'TEXT',
+    'macro_scenario': 'TEXT',
+    'reference_product': 'TEXT',
+    'reference_amount': 'REAL',
+    'reference_unit': 'TEXT',
+}
+INDEXED_COLUMNS = ['activity_name', 'geography', 'reference_product', 'activity_id']
+
+
+def _header_row(file_path):
+    # Streaming general info stops reading right after the reference product
+    info = EcoSpoldProcessor(file_path, streaming=True).extract_general_info()
+    reference = info.get('Reference Product') or {}
+    stat = os.stat(file_path)
+    return {
+        'file_path': file_path,
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'dataset_id': os.path.splitext(os.path.basename(file_path))[0],
+        'activity_id': info.get('Activity ID'),
+        'activity_name': info.get('Activity Name'),
+        'geography': info.get('Geography'),
+        'start_date': info.get('Start Date'),
+        'end_date': info.get('End Date'),
+        'macro_scenario': info.get('Macro Scenario'),
+        'reference_product': reference.get('Name'),
+        'reference_amount': pd.to_numeric(reference.get('Amount'), errors='coerce'),
+        'reference_unit': reference.get('Unit'),
+    }
+
+
+def _scan_chunk(file_paths):
+    rows, errors = [], []
+    for file_path in file_paths:
+        try:
+            rows.append(_header_row(file_path))
+        except Exception as error:
+            errors.append({'File': file_path, 'Error': f"{type(error).__name__}: {error}"})
+    return rows, errors
+
+
+class SpoldCatalog:
+    def __init__(self, db_path):
+        """
+        Persistent SQLite index of the dataset headers (activity, geography, time period,
+        macro scenario, reference product) with the path, mtime and size of every file.
+        update() only rescans files that are new or changed, so lookups never parse XML.
+        """
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.errors = pd.DataFrame(columns=['File', 'Error'])
+        self._create_schema()
+
+    def _create_schema(self):
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version != CATALOG_VERSION:
+            self.connection.execute('DROP TABLE IF EXISTS datasets')
+
+        columns = ', '.join(f'{name} {sql_type}' for name, sql_type in CATALOG_COLUMNS.items())
+        self.connection.execute(f'CREATE TABLE IF NOT EXISTS datasets '
+                                f'(file_path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, {columns})')
+        for column in INDEXED_COLUMNS:
+            self.connection.execute(f'CREATE INDEX IF NOT EXISTS idx_datasets_{column} ON datasets ({column})')
+        self.connection.execute(f'PRAGMA user_version = {CATALOG_VERSION}')
+        self.connection.commit()
+
+    def update(self, source, max_workers=1, chunk_size=256):
+        """
+        Indexes the .spold files of a directory or glob pattern. Unchanged files (same mtime
+        and size) are skipped and entries of deleted files are removed.
+        Returns the number of added, updated, removed and unchanged files; files whose header
+        could not be read are listed in self.errors.
+        """
+        if is_archive(source):
+            raise ValueError("The catalog indexes files on disk, archive members have no path or mtime of their own.")
+        files = [os.path.abspath(file_path) for file_path in find_spold_files(source)]
+        known = {file_path: (mtime_ns, size) for file_path, mtime_ns, size
+                 in self.connection.execute('SELECT file_path, mtime_ns, size FROM datasets')}
+
+        to_scan = []
+        for file_path in files:
+            stat = os.stat(file_path)
+            if known.get(file_path) != (stat.st_mtime_ns, stat.st_size):
+                to_scan.append(file_path)
+
+        rows, errors = [], []
+        for chunk_rows, chunk_errors in self._scan(to_scan, max_workers, chunk_size):
+            rows.extend(chunk_rows)
+            errors.extend(chunk_errors)
+
+        # Entries of deleted files are dropped, other sources indexed in the same catalog are kept
+        scanned = set(files)
+        removed = [file_path for file_path in known if file_path not in scanned and not os.path.exists(file_path)]
+
+        columns = ['file_path', 'mtime_ns', 'size'] + list(CATALOG_COLUMNS)
+        with self.connection:
+            self.connection.executemany('DELETE FROM datasets WHERE file_path = ?', [(path,) for path in removed])
+            self.connection.executemany(
+                f'INSERT OR REPLACE INTO datasets ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})',
+                [tuple(None if pd.isna(row[column]) else row[column] for column in columns) for row in rows])
+
+        self.errors = pd.DataFrame(errors, columns=['File', 'Error'])
+        added = sum(1 for row in rows if row['file_path'] not in known)
+        count('catalog.files_scanned', len(to_scan))
+        return {'added': added, 'updated': len(rows) - added, 'removed': len(removed),
+                'unchanged': len(files) - len(to_scan), 'errors': len(errors)}
+
+    @staticmethod
+    def _scan(file_paths, max_workers, chunk_size):
+        chunks = [file_paths[i:i + chunk_size] for i in range(0, len(file_paths), chunk_size)]
+        if max_workers == 1:
+            yield from map(_scan_chunk, chunks)
+            return
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            yield from executor.map(_scan_chunk, chunks)
+
+    @staticmethod
+    def _where(filters):
+        clauses, params = [], []
+        for column, value in filters.items():
+            if column not in CATALOG_COLUMNS and column != 'file_path':
+                raise ValueError(f"Invalid catalog column {column!r}. Use one of {['file_path'] + list(CATALOG_COLUMNS)}.")
+            if isinstance(value, (list, tuple, set)):
+                value = list(value)
+                clauses.append(f'{column} IN ({", ".join("?" * len(value))})')
+                params.extend(value)
+            elif isinstance(value, str) and '%' in value:
+                # SQL LIKE patterns, case-insensitive for ASCII
+                clauses.append(f'{column} LIKE ?')
+                params.append(value)
+            else:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def find(self, **filters):
+        """
+        Returns the catalog rows matching every filter as a DataFrame, e.g.
+        find(activity_name='market for electricity%', geography='CH'). Values containing
+        % are LIKE patterns, lists match any of their values.
+        """
+        where, params = self._where(filters)
+        return pd.read_sql_query(f'SELECT * FROM datasets{where} ORDER BY file_path', self.connection, params=params)
+
+    def files(self, **filters):
+        """
+        Returns the file paths matching the filters, e.g. to feed EcoSpoldDatabaseExtractor.
+        """
+        where, params = self._where(filters)
+        return [row[0] for row in self.connection.execute(f'SELECT file_path FROM datasets{where} ORDER BY file_path', params)]
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM datasets').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+# Usage example
+# with SpoldCatalog(r"C:\my\path\to\ecoinvent_catalog.sqlite") as catalog:
+#     print(catalog.update(r"C:\my\path\to\ecoinvent\datasets"))
+#     files = catalog.files(activity_name='market for electricity%', geography='CH')
+# df_info, df_intermediate, df_elementary = EcoSpoldDatabaseExtractor(files).extract()
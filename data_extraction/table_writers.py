@@ -0,0 +1,192 @@
+import hashlib
+import os
+import shutil
+import uuid
+
+import pandas as pd
+
+from .instrumentation import timed
+
+DATASET_COLUMN = 'Dataset ID'
+EXCEL_MAX_ROWS = 1048576
+
+
+def _dense(df):
+    # Compact concentration tables are written in their dense form
+    return df if isinstance(df, pd.DataFrame) else df.to_dense()
+
+
+def _excel_cell(value):
+    # Excel cells hold scalars only, e.g. the comment lists of the dataset info
+    if isinstance(value, (list, tuple)):
+        return "\n".join(str(item) for item in value)
+    if isinstance(value, dict):
+        return str(value)
+    return value
+
+
+class TableWriter:
+    def __init__(self, output_dir, partition_by_dataset=False, append=True):
+        """
+        Base class of the columnar writers. Each table gets its own directory under output_dir;
+        every write() adds new part files, so batch runs can append table by table. With
+        partition_by_dataset, parts go to '<table>/Dataset ID=<id>/' subdirectories.
+        With append=False, existing data of a table is removed on its first write.
+        """
+        self.output_dir = output_dir
+        self.partition_by_dataset = partition_by_dataset
+        self.append = append
+        self._started = set()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _table_dir(self, table_name):
+        table_dir = os.path.join(self.output_dir, table_name)
+        if table_name not in self._started:
+            if not self.append and os.path.exists(table_dir):
+                shutil.rmtree(table_dir)
+            os.makedirs(table_dir, exist_ok=True)
+            self._started.add(table_name)
+        return table_dir
+
+    def _partitions(self, table_name, df, dataset):
+        table_dir = self._table_dir(table_name)
+        if dataset is not None and DATASET_COLUMN not in df.columns:
+            df = df.assign(**{DATASET_COLUMN: dataset})
+
+        if not self.partition_by_dataset or DATASET_COLUMN not in df.columns:
+            yield table_dir, df
+            return
+
+        # Hive-style layout, the partition key lives in the directory name only
+        for dataset_id, df_dataset in df.groupby(DATASET_COLUMN, sort=False, observed=True):
+            partition_dir = os.path.join(table_dir, f"{DATASET_COLUMN}={dataset_id}")
+            os.makedirs(partition_dir, exist_ok=True)
+            yield partition_dir, df_dataset.drop(columns=DATASET_COLUMN)
+
+    @timed('export.write')
+    def write(self, table_name, df, dataset=None):
+        df = _dense(df)
+        for directory, df_part in self._partitions(table_name, df, dataset):
+            self._write_part(directory, df_part.reset_index(drop=True))
+
+    def _write_part(self, directory, df):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ParquetTableWriter(TableWriter):
+    def __init__(self, output_dir, partition_by_dataset=False, append=True, compression='snappy'):
+        super().__init__(output_dir, partition_by_dataset, append)
+        self.compression = compression
+
+    def _write_part(self, directory, df):
+        df.to_parquet(os.path.join(directory, f"part-{uuid.uuid4().hex}.parquet"),
+                      index=False, compression=self.compression)
+
+
+class FeatherTableWriter(TableWriter):
+    # Arrow IPC files, the fastest to write and to memory-map back
+    def _write_part(self, directory, df):
+        df.to_feather(os.path.join(directory, f"part-{uuid.uuid4().hex}.arrow"))
+
+
+class CsvTableWriter(TableWriter):
+    def __init__(self, output_dir, partition_by_dataset=False, append=True, chunksize=100000):
+        super().__init__(output_dir, partition_by_dataset, append)
+        self.chunksize = chunksize
+
+    def _write_part(self, directory, df):
+        # Parts with the same columns grow one file, the header is written once
+        schema = hashlib.sha1('\x1f'.join(map(str, df.columns)).encode()).hexdigest()[:12]
+        path = os.path.join(directory, f"part-{schema}.csv")
+        new_file = not os.path.exists(path)
+        df.to_csv(path, mode='w' if new_file else 'a', header=new_file, index=False, chunksize=self.chunksize)
+
+
+class ExcelTableWriter:
+    def __init__(self, output_file):
+        """
+        Opt-in Excel export for manual review, streamed with openpyxl's write-only mode.
+        Every write of a table is aligned on the header of its sheet; tables longer than an
+        Excel sheet, or written again with new columns, continue on '<table>_2', '<table>_3',
+        ... under the extended header.
+        """
+        from openpyxl import Workbook
+
+        self.output_file = output_file
+        self.workbook = Workbook(write_only=True)
+        self._sheets = {}
+        self._headers = {}
+        self._rows = {}
+
+    def _new_sheet(self, table_name, header):
+        sheets = self._sheets.setdefault(table_name, [])
+        title = table_name if not sheets else f"{table_name}_{len(sheets) + 1}"
+        sheet = self.workbook.create_sheet(title=title[:31])
+        sheet.append([str(col) for col in header])
+        sheets.append(sheet)
+        self._headers[table_name] = header
+        self._rows[table_name] = 1
+        return sheet
+
+    @timed('export.write')
+    def write(self, table_name, df, dataset=None):
+        df = _dense(df)
+        if dataset is not None and DATASET_COLUMN not in df.columns:
+            df = df.assign(**{DATASET_COLUMN: dataset})
+
+        for col in df.columns[df.dtypes == object]:
+            if df[col].map(lambda value: isinstance(value, (list, tuple, dict))).any():
+                df = df.assign(**{col: df[col].map(_excel_cell)})
+
+        # Write-only sheets cannot rewrite their header, new columns start a new sheet
+        header = self._headers.get(table_name, [])
+        new_columns = [col for col in df.columns if col not in header]
+        if table_name not in self._sheets or new_columns:
+            header = header + new_columns
+            sheet = self._new_sheet(table_name, header)
+        else:
+            sheet = self._sheets[table_name][-1]
+        df = df.reindex(columns=header)
+
+        # Empty cells for missing values, as DataFrame.to_excel does
+        for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+            if self._rows[table_name] >= EXCEL_MAX_ROWS:
+                sheet = self._new_sheet(table_name, header)
+            sheet.append(row)
+            self._rows[table_name] += 1
+
+    def close(self):
+        self.workbook.save(self.output_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+WRITERS = {
+    'parquet': ParquetTableWriter,
+    'feather': FeatherTableWriter,
+    'csv': CsvTableWriter,
+    'excel': ExcelTableWriter,
+}
+
+
+def get_table_writer(output_format, output_path, **options):
+    """
+    Returns the writer for 'parquet', 'feather', 'csv' or 'excel' (output_path is then a file).
+    """
+    if output_format not in WRITERS:
+        raise ValueError(f"Invalid output format. Use one of {list(WRITERS)}.")
+    return WRITERS[output_format](output_path, **options)
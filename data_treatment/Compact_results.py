@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+CATEGORICAL_COLUMNS = ['Dataset ID', 'Flow Name', 'Sub Process', 'Unit', 'Flow Type', 'Compartment', 'Subcompartment']
+
+
+class CompactConcentrations:
+    def __init__(self, meta, values, element_columns, columns, dtypes):
+        """
+        Compact form of a concentration table: element columns in a CSR sparse matrix (zeros
+        are not stored), the other columns in a DataFrame with categorical labels.
+        Use from_dense() to build one and to_dense() to get the usual DataFrame back.
+        """
+        self.meta = meta
+        self.values = values
+        self.element_columns = list(element_columns)
+        self.columns = list(columns)
+        self.dtypes = dtypes
+
+    @classmethod
+    def from_dense(cls, df, element_columns, float32=False):
+        """
+        Element columns of df are stored sparse, as float64 (lossless) or float32 (half the size).
+        """
+        from scipy import sparse
+
+        element_columns = [col for col in element_columns if col in df.columns]
+        dtype = np.float32 if float32 else np.float64
+
+        values = sparse.csr_matrix(df[element_columns].to_numpy(dtype=dtype))
+        meta = df.drop(columns=element_columns)
+        for col in CATEGORICAL_COLUMNS:
+            if col in meta.columns:
+                meta[col] = meta[col].astype('category')
+
+        return cls(meta, values, element_columns, df.columns, df.dtypes.to_dict())
+
+    def to_dense(self):
+        """
+        Rebuilds the dense DataFrame with the original index, column order and dtypes.
+        """
+        # Only the categorical labels need casting back
+        meta = self.meta.astype({col: self.dtypes[col] for col in self.meta.columns
+                                 if col in self.dtypes and self.meta[col].dtype != self.dtypes[col]})
+        elements = pd.DataFrame(self.values.toarray(), columns=self.element_columns, index=meta.index, dtype=np.float64)
+        return pd.concat([meta, elements], axis=1)[self.columns]
+
+    @classmethod
+    def concat(cls, tables):
+        """
+        Stacks compact tables, e.g. the results of many datasets, without densifying them.
+        """
+        from scipy import sparse
+
+        tables = list(tables)
+        element_columns = list(dict.fromkeys(col for table in tables for col in table.element_columns))
+        columns = list(dict.fromkeys(col for table in tables for col in table.columns))
+
+        blocks = []
+        for table in tables:
+            # Align every block on the union of element columns
+            positions = [element_columns.index(col) for col in table.element_columns]
+            coo = table.values.tocoo()
+            blocks.append(sparse.csr_matrix((coo.data, (coo.row, np.asarray(positions, dtype=np.int64)[coo.col])),
+                                            shape=(coo.shape[0], len(element_columns))))
+
+        meta = pd.concat([table.meta for table in tables], ignore_index=True)
+        for col in CATEGORICAL_COLUMNS:
+            if col in meta.columns:
+                meta[col] = meta[col].astype('category')
+
+        dtypes = {}
+        for table in tables:
+            dtypes.update(table.dtypes)
+        return cls(meta, sparse.vstack(blocks, format='csr'), element_columns, columns, dtypes)
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def memory_usage(self):
+        """
+        Bytes held by the compact table.
+        """
+        sparse_bytes = self.values.data.nbytes + self.values.indices.nbytes + self.values.indptr.nbytes
+        return int(self.meta.memory_usage(deep=True).sum()) + sparse_bytes
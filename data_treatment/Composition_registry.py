@@ -0,0 +1,148 @@
+import re
+from functools import lru_cache
+
+from .Compound_matcher import get_compound_matcher
+
+# Periodic table with names and symbols
+PERIODIC_TABLE = {
+    "H": "hydrogen", "He": "helium", "Li": "lithium", "Be": "beryllium", "B": "boron", "C": "carbon",
+    "N": "nitrogen", "O": "oxygen", "F": "fluorine", "Ne": "neon", "Na": "sodium", "Mg": "magnesium",
+    "Al": "aluminium", "Si": "silicon", "P": "phosphorus", "S": "sulfur", "Cl": "chlorine", "Ar": "argon",
+    "K": "potassium", "Ca": "calcium", "Sc": "scandium", "Ti": "titanium", "V": "vanadium",
+    "Cr": "chromium", "Mn": "manganese", "Fe": "iron", "Co": "cobalt", "Ni": "nickel", "Cu": "copper",
+    "Zn": "zinc", "Ga": "gallium", "Ge": "germanium", "As": "arsenic", "Se": "selenium", "Br": "bromine",
+    "Kr": "krypton", "Rb": "rubidium", "Sr": "strontium", "Y": "yttrium", "Zr": "zirconium",
+    "Nb": "niobium", "Mo": "molybdenum", "Tc": "technetium", "Ru": "ruthenium", "Rh": "rhodium",
+    "Pd": "palladium", "Ag": "silver", "Cd": "cadmium", "In": "indium", "Sn": "tin", "Sb": "antimony",
+    "Te": "tellurium", "I": "iodine", "Xe": "xenon", "Cs": "cesium", "Ba": "barium", "La": "lanthanum",
+    "Ce": "cerium", "Pr": "praseodymium", "Nd": "neodymium", "Pm": "promethium", "Sm": "samarium",
+    "Eu": "europium", "Gd": "gadolinium", "Tb": "terbium", "Dy": "dysprosium", "Ho": "holmium",
+    "Er": "erbium", "Tm": "thulium", "Yb": "ytterbium", "Lu": "lutetium", "Hf": "hafnium",
+    "Ta": "tantalum", "W": "tungsten", "Re": "rhenium", "Os": "osmium", "Ir": "iridium", "Pt": "platinum",
+    "Au": "gold", "Hg": "mercury", "Tl": "thallium", "Pb": "lead", "Bi": "bismuth", "Po": "polonium",
+    "At": "astatine", "Rn": "radon", "Fr": "francium", "Ra": "radium", "Ac": "actinium", "Th": "thorium",
+    "Pa": "protactinium", "U": "uranium", "Np": "neptunium", "Pu": "plutonium", "Am": "americium",
+    "Cm": "curium", "Bk": "berkelium", "Cf": "californium", "Es": "einsteinium", "Fm": "fermium",
+    "Md": "mendelevium", "No": "nobelium", "Lr": "lawrencium", "Rf": "rutherfordium", "Db": "dubnium",
+    "Sg": "seaborgium", "Bh": "bohrium", "Hs": "hassium", "Mt": "meitnerium", "Ds": "darmstadtium",
+    "Rg": "roentgenium", "Cn": "copernicium", "Nh": "nihonium", "Fl": "flerovium", "Mc": "moscovium",
+    "Lv": "livermorium", "Ts": "tennessine", "Og": "oganesson"
+}
+
+# Molar masses (g/mol), conventional atomic weights. Elements without stable isotopes
+# use the mass number of their longest-lived isotope.
+MOLAR_MASSES = {
+    "H": 1.008, "He": 4.0026, "Li": 6.94, "Be": 9.0122, "B": 10.81, "C": 12.011,
+    "N": 14.007, "O": 15.999, "F": 18.998, "Ne": 20.180, "Na": 22.990, "Mg": 24.305,
+    "Al": 26.982, "Si": 28.085, "P": 30.974, "S": 32.06, "Cl": 35.45, "Ar": 39.95,
+    "K": 39.098, "Ca": 40.078, "Sc": 44.956, "Ti": 47.867, "V": 50.942,
+    "Cr": 51.996, "Mn": 54.938, "Fe": 55.845, "Co": 58.933, "Ni": 58.693, "Cu": 63.546,
+    "Zn": 65.38, "Ga": 69.723, "Ge": 72.630, "As": 74.922, "Se": 78.971, "Br": 79.904,
+    "Kr": 83.798, "Rb": 85.468, "Sr": 87.62, "Y": 88.906, "Zr": 91.224,
+    "Nb": 92.906, "Mo": 95.95, "Tc": 98.0, "Ru": 101.07, "Rh": 102.91,
+    "Pd": 106.42, "Ag": 107.87, "Cd": 112.41, "In": 114.82, "Sn": 118.71, "Sb": 121.76,
+    "Te": 127.60, "I": 126.90, "Xe": 131.29, "Cs": 132.91, "Ba": 137.33, "La": 138.91,
+    "Ce": 140.12, "Pr": 140.91, "Nd": 144.24, "Pm": 145.0, "Sm": 150.36,
+    "Eu": 151.96, "Gd": 157.25, "Tb": 158.93, "Dy": 162.50, "Ho": 164.93,
+    "Er": 167.26, "Tm": 168.93, "Yb": 173.05, "Lu": 174.97, "Hf": 178.49,
+    "Ta": 180.95, "W": 183.84, "Re": 186.21, "Os": 190.23, "Ir": 192.22, "Pt": 195.08,
+    "Au": 196.97, "Hg": 200.59, "Tl": 204.38, "Pb": 207.2, "Bi": 208.98, "Po": 209.0,
+    "At": 210.0, "Rn": 222.0, "Fr": 223.0, "Ra": 226.0, "Ac": 227.0, "Th": 232.04,
+    "Pa": 231.04, "U": 238.03, "Np": 237.0, "Pu": 244.0, "Am": 243.0,
+    "Cm": 247.0, "Bk": 247.0, "Cf": 251.0, "Es": 252.0, "Fm": 257.0,
+    "Md": 258.0, "No": 259.0, "Lr": 262.0, "Rf": 267.0, "Db": 268.0,
+    "Sg": 269.0, "Bh": 270.0, "Hs": 269.0, "Mt": 278.0, "Ds": 281.0,
+    "Rg": 282.0, "Cn": 285.0, "Nh": 286.0, "Fl": 289.0, "Mc": 290.0,
+    "Lv": 293.0, "Ts": 294.0, "Og": 294.0
+}
+
+# Common compounds matched in elementary flow names, by chemical formula
+COMPOUND_FORMULAS = {
+    'Nitrogen oxides': 'NO2',
+    'carbon dioxide': 'CO2',
+    'Sulfur dioxide': 'SO2',
+    'Sulfuric acid': 'H2SO4',
+    'Ammonium': 'NH4',
+    'Phosphorus': 'P',
+    'Water': 'H2O',
+}
+
+_FORMULA_TOKEN = re.compile(r'([A-Z][a-z]?|\(|\))(\d*)')
+
+
+def parse_formula(formula):
+    """
+    Parses a chemical formula such as "H2SO4" or "Ca(OH)2" into {symbol: atom count},
+    in order of first appearance.
+    """
+    stack = [{}]
+    position = 0
+    for match in _FORMULA_TOKEN.finditer(formula):
+        if match.start() != position:
+            raise ValueError(f"Invalid chemical formula: {formula!r}")
+        position = match.end()
+
+        token, count = match.group(1), int(match.group(2) or 1)
+        if token == '(':
+            if match.group(2):
+                raise ValueError(f"Invalid chemical formula: {formula!r}")
+            stack.append({})
+        elif token == ')':
+            if len(stack) == 1:
+                raise ValueError(f"Unbalanced parentheses in formula: {formula!r}")
+            group = stack.pop()
+            for symbol, atoms in group.items():
+                stack[-1][symbol] = stack[-1].get(symbol, 0) + atoms * count
+        else:
+            if token not in MOLAR_MASSES:
+                raise ValueError(f"Unknown element {token!r} in formula: {formula!r}")
+            stack[-1][token] = stack[-1].get(token, 0) + count
+
+    if position != len(formula) or len(stack) != 1 or not stack[0]:
+        raise ValueError(f"Invalid chemical formula: {formula!r}")
+    return stack[0]
+
+
+@lru_cache(maxsize=None)
+def mass_fractions(formula):
+    """
+    Returns {symbol: mass fraction} for a chemical formula.
+    """
+    atoms = parse_formula(formula)
+    masses = {symbol: count * MOLAR_MASSES[symbol] for symbol, count in atoms.items()}
+    total_mass = sum(masses.values())
+    return {symbol: mass / total_mass for symbol, mass in masses.items()}
+
+
+class CompositionRegistry:
+    def __init__(self, compound_formulas=None):
+        """
+        Element tables and compound compositions shared by the flow processors. Compound
+        compositions are derived from their formulas once and kept as a dense
+        (compounds x elements) array in element order.
+        """
+        self.periodic_table = PERIODIC_TABLE
+        self.elements = list(PERIODIC_TABLE.keys())
+        self.element_index = {symbol: i for i, symbol in enumerate(self.elements)}
+        self.molar_masses = {PERIODIC_TABLE[symbol]: mass for symbol, mass in MOLAR_MASSES.items()}
+        self.compound_formulas = dict(compound_formulas if compound_formulas is not None else COMPOUND_FORMULAS)
+
+        # Keyed by element name, as the processors always did
+        self.compound_compositions = {
+            compound: {PERIODIC_TABLE[symbol]: fraction for symbol, fraction in mass_fractions(formula).items()}
+            for compound, formula in self.compound_formulas.items()
+        }
+
+        self.compound_matcher = get_compound_matcher(self.compound_compositions, PERIODIC_TABLE.values())
+        self.fraction_matrix = self.compound_matcher.fractions
+
+    def mass_fractions(self, formula):
+        return mass_fractions(formula)
+
+
+@lru_cache(maxsize=None)
+def get_composition_registry():
+    """
+    Returns the process-wide registry built from COMPOUND_FORMULAS.
+    """
+    return CompositionRegistry()
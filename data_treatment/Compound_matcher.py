@@ -0,0 +1,123 @@
+from collections import deque
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Matchers shared by every processor of the process, keyed by compound table
+_MATCHERS = {}
+
+
+class CompoundMatcher:
+    def __init__(self, compound_compositions, element_names, cache_size=100000):
+        """
+        Finds every compound of compound_compositions contained in a flow name with one
+        Aho-Corasick automaton over the lowercased compound names, so the cost of a lookup
+        does not grow with the number of compounds. Resolved composition vectors are kept
+        in a bounded LRU cache keyed by the lowercased flow name.
+        """
+        self.compounds = list(compound_compositions.keys())
+        self.element_names = list(element_names)
+        element_index = {element_name: i for i, element_name in enumerate(self.element_names)}
+
+        # compounds x elements mass fractions
+        self.fractions = np.zeros((len(self.compounds), len(self.element_names)))
+        for i, composition in enumerate(compound_compositions.values()):
+            for element_name, fraction in composition.items():
+                self.fractions[i, element_index[element_name]] = fraction
+
+        self._build_automaton([compound.lower() for compound in self.compounds])
+        self._resolve = lru_cache(maxsize=cache_size)(self._resolve_uncached)
+
+    def _build_automaton(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+
+        for index, pattern in enumerate(patterns):
+            node = 0
+            for char in pattern:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                    next_node = len(self._goto) - 1
+                    self._goto[node][char] = next_node
+                node = next_node
+            self._output[node] += (index,)
+
+        # Breadth-first pass to set failure links and merge outputs along them
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, next_node in self._goto[node].items():
+                queue.append(next_node)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_node] = self._goto[fail].get(char, 0)
+                self._output[next_node] += self._output[self._fail[next_node]]
+
+    def match(self, flow_name):
+        """
+        Returns the indices (in compound table order) of the compounds contained in flow_name.
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        found = set()
+        for char in flow_name.lower():
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found.update(output[node])
+        return tuple(sorted(found))
+
+    def _resolve_uncached(self, normalized_name):
+        vector = np.zeros(len(self.element_names))
+        for index in self.match(normalized_name):
+            vector += self.fractions[index]
+        vector.flags.writeable = False
+        return vector
+
+    def composition_vector(self, flow_name):
+        return self._resolve(flow_name.lower())
+
+    def composition_matrix(self, flow_names, sparse=False):
+        """
+        Returns a (flows x elements) matrix of the compound mass fractions matched in each
+        flow name. Each distinct name is resolved once per call, then served from the cache.
+        With sparse=True it is a scipy CSR matrix gathered from the distinct names, so no
+        dense (flows x elements) array is built.
+        """
+        codes, unique_names = pd.factorize(pd.Series(flow_names).str.lower())
+        matrix = np.zeros((len(unique_names) + 1, len(self.element_names)))
+        for i, name in enumerate(unique_names):
+            matrix[i] = self._resolve(name)
+        if sparse:
+            from scipy import sparse as scipy_sparse
+            matrix = scipy_sparse.csr_matrix(matrix)
+        # Missing names (code -1) pick the trailing zero row
+        return matrix[codes]
+
+    def cache_info(self):
+        return self._resolve.cache_info()
+
+    def cache_clear(self):
+        self._resolve.cache_clear()
+
+
+def get_compound_matcher(compound_compositions, element_names, cache_size=100000):
+    """
+    Returns the process-wide matcher for this compound table, building it on first use.
+    """
+    key = (
+        tuple((compound, tuple(composition.items())) for compound, composition in compound_compositions.items()),
+        tuple(element_names),
+    )
+    matcher = _MATCHERS.get(key)
+    if matcher is None:
+        matcher = CompoundMatcher(compound_compositions, element_names, cache_size=cache_size)
+        _MATCHERS[key] = matcher
+    return matcher
@@ -1,74 +1,42 @@
+import numpy as np
 import pandas as pd
 
+from data_extraction.extract_ei_spold_data import numeric_column
+from data_extraction.instrumentation import count, is_enabled, timed
+
+from .Compact_results import CompactConcentrations
+from .Composition_registry import get_composition_registry
+from .Monte_carlo import DEFAULT_PERCENTILES, monte_carlo_table
+from .Unit_converter import WATER_DENSITY, convert_to_kg
+
+GROUP_COLUMNS = ['Compartment', 'Subcompartment', 'Flow Type']
+
+
 class ElementaryFlowProcessor:
     def __init__(self):
-        # Periodic table with names and symbols
-        self.periodic_table = {
-            "H": "hydrogen", "He": "helium", "Li": "lithium", "Be": "beryllium", "B": "boron", "C": "carbon",
-            "N": "nitrogen", "O": "oxygen", "F": "fluorine", "Ne": "neon", "Na": "sodium", "Mg": "magnesium",
-            "Al": "aluminium", "Si": "silicon", "P": "phosphorus", "S": "sulfur", "Cl": "chlorine", "Ar": "argon",
-            "K": "potassium", "Ca": "calcium", "Sc": "scandium", "Ti": "titanium", "V": "vanadium",
-            "Cr": "chromium", "Mn": "manganese", "Fe": "iron", "Co": "cobalt", "Ni": "nickel", "Cu": "copper",
-            "Zn": "zinc", "Ga": "gallium", "Ge": "germanium", "As": "arsenic", "Se": "selenium", "Br": "bromine",
-            "Kr": "krypton", "Rb": "rubidium", "Sr": "strontium", "Y": "yttrium", "Zr": "zirconium",
-            "Nb": "niobium", "Mo": "molybdenum", "Tc": "technetium", "Ru": "ruthenium", "Rh": "rhodium",
-            "Pd": "palladium", "Ag": "silver", "Cd": "cadmium", "In": "indium", "Sn": "tin", "Sb": "antimony",
-            "Te": "tellurium", "I": "iodine", "Xe": "xenon", "Cs": "cesium", "Ba": "barium", "La": "lanthanum",
-            "Ce": "cerium", "Pr": "praseodymium", "Nd": "neodymium", "Pm": "promethium", "Sm": "samarium",
-            "Eu": "europium", "Gd": "gadolinium", "Tb": "terbium", "Dy": "dysprosium", "Ho": "holmium",
-            "Er": "erbium", "Tm": "thulium", "Yb": "ytterbium", "Lu": "lutetium", "Hf": "hafnium",
-            "Ta": "tantalum", "W": "tungsten", "Re": "rhenium", "Os": "osmium", "Ir": "iridium", "Pt": "platinum",
-            "Au": "gold", "Hg": "mercury", "Tl": "thallium", "Pb": "lead", "Bi": "bismuth", "Po": "polonium",
-            "At": "astatine", "Rn": "radon", "Fr": "francium", "Ra": "radium", "Ac": "actinium", "Th": "thorium",
-            "Pa": "protactinium", "U": "uranium", "Np": "neptunium", "Pu": "plutonium", "Am": "americium",
-            "Cm": "curium", "Bk": "berkelium", "Cf": "californium", "Es": "einsteinium", "Fm": "fermium",
-            "Md": "mendelevium", "No": "nobelium", "Lr": "lawrencium", "Rf": "rutherfordium", "Db": "dubnium",
-            "Sg": "seaborgium", "Bh": "bohrium", "Hs": "hassium", "Mt": "meitnerium", "Ds": "darmstadtium",
-            "Rg": "roentgenium", "Cn": "copernicium", "Nh": "nihonium", "Fl": "flerovium", "Mc": "moscovium",
-            "Lv": "livermorium", "Ts": "tennessine", "Og": "oganesson"
-        }
-        self.elements = list(self.periodic_table.keys())
-
-        # Molar masses (g/mol)
-        self.molar_masses = {
-            'hydrogen': 1.008,
-            'carbon': 12.011,
-            'nitrogen': 14.007,
-            'oxygen': 15.999,
-            'phosphorus': 30.974,
-            'sulfur': 32.06
-        }
-
-        # Common compound compositions
-        self.compound_compositions = {
-            'Nitrogen oxides': {'nitrogen': self.molar_masses['nitrogen'] / (self.molar_masses['nitrogen'] + 2 * self.molar_masses['oxygen']),
-                                'oxygen': 2 * self.molar_masses['oxygen'] / (self.molar_masses['nitrogen'] + 2 * self.molar_masses['oxygen'])},
-            'carbon dioxide': {'carbon': self.molar_masses['carbon'] / (self.molar_masses['carbon'] + 2 * self.molar_masses['oxygen']),
-                               'oxygen': 2 * self.molar_masses['oxygen'] / (self.molar_masses['carbon'] + 2 * self.molar_masses['oxygen'])},
-            'Sulfur dioxide': {'sulfur': self.molar_masses['sulfur'] / (self.molar_masses['sulfur'] + 2 * self.molar_masses['oxygen']),
-                               'oxygen': 2 * self.molar_masses['oxygen'] / (self.molar_masses['sulfur'] + 2 * self.molar_masses['oxygen'])},
-            'Sulfuric acid': {'sulfur': self.molar_masses['sulfur'] / (self.molar_masses['sulfur'] + 4 * self.molar_masses['oxygen'] + 2 * self.molar_masses['hydrogen']),
-                              'oxygen': 4 * self.molar_masses['oxygen'] / (self.molar_masses['sulfur'] + 4 * self.molar_masses['oxygen'] + 2 * self.molar_masses['hydrogen']),
-                              'hydrogen': 2 * self.molar_masses['hydrogen'] / (self.molar_masses['sulfur'] + 4 * self.molar_masses['oxygen'] + 2 * self.molar_masses['hydrogen'])},
-            'Ammonium': {'nitrogen': self.molar_masses['nitrogen'] / (self.molar_masses['nitrogen'] + 4 * self.molar_masses['hydrogen']),
-                         'hydrogen': 4 * self.molar_masses['hydrogen'] / (self.molar_masses['nitrogen'] + 4 * self.molar_masses['hydrogen'])},
-            'Phosphorus': {'phosphorus': 1.0},
-            'Water': {'hydrogen': 2 * self.molar_masses['hydrogen'] / (2 * self.molar_masses['hydrogen'] + self.molar_masses['oxygen']),
-                      'oxygen': self.molar_masses['oxygen'] / (2 * self.molar_masses['hydrogen'] + self.molar_masses['oxygen'])},
-        }
-
+        # Element tables and compound compositions are built once per process
+        registry = get_composition_registry()
+        self.periodic_table = registry.periodic_table
+        self.elements = registry.elements
+        self.molar_masses = registry.molar_masses
+        self.compound_compositions = registry.compound_compositions
+        self.compound_matcher = registry.compound_matcher
+        # Rows dropped by the last unit conversion, with a 'Drop Reason' column
+        self.dropped_flows = pd.DataFrame()
+
+    @timed('elementary.process_dataframe')
     def process_dataframe(self, df):
         if not df.empty:
             # Convert all numeric columns
             numeric_cols = ['Amount', 'dry mass (kg)'] + \
-                           [f'{el} content (dimensionless)' for el in self.elements] + \
+                           [f'{self.periodic_table[el]} content (dimensionless)' for el in self.elements] + \
                            ['carbon content, fossil (dimensionless)',
                             'carbon content, non-fossil (dimensionless)',
                             'water content (dimensionless)']
 
             for col in numeric_cols:
                 if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+                    df[col] = numeric_column(df[col]).fillna(0)
 
             # Exclude specific flows
             excluded_flows = [
@@ -78,115 +46,181 @@ class ElementaryFlowProcessor:
                 "TOC, Total Organic Carbon"
             ]
 
-            df = df[~df['Name'].isin(excluded_flows)]
+            is_excluded = df['Name'].isin(excluded_flows)
+            count('flows_excluded.bod_cod_doc_toc', is_excluded.sum())
+            df = df[~is_excluded]
 
         return df
 
-    def get_grouped_flows(self, df_elementary):
-        volume_to_mass_conversion_factors = {
-            'water': {'SCTP_factor': 1000}  # 1m3 = 1000kg of water
-        }
-
-        # Process kg flows
-        df_kg = df_elementary[df_elementary['Unit'] == 'kg'].copy()
-        df_kg = self.process_dataframe(df_kg)
-
-        # Process m3 flows and convert to kg
-        df_m3 = df_elementary[df_elementary['Unit'] == 'm3'].copy()
-        df_m3 = self.process_dataframe(df_m3)
-
-        for index, row in df_m3.iterrows():
-            flow_name = row['Name'].strip().lower()
-            if 'water' in flow_name:
-                conversion_factor = volume_to_mass_conversion_factors['water']['SCTP_factor']
-                df_m3.at[index, 'Amount'] *= conversion_factor
-                df_m3.at[index, 'Unit'] = 'kg'
-
-        # Combine the kg flows and converted m3 flows
-        df_combined = pd.concat([df_kg, df_m3], ignore_index=True)
-
-        # Calculate the total sum of all grouped flows
-        total_sum_all_flows = df_combined['Amount'].sum()
+    @timed('elementary.get_grouped_flows')
+    def get_grouped_flows(self, df_elementary, dataset_col=None):
+        """
+        With dataset_col (e.g. 'Dataset ID'), df_elementary may stack many datasets: flows
+        are then grouped per dataset as well, and every later step keeps the dataset key.
+        """
+        # Only water has a known density among volume flows (1m3 = 1000kg of water)
+        def water_density(df):
+            is_water = df['Name'].str.strip().str.lower().str.contains('water', regex=False)
+            return np.where(is_water.to_numpy(dtype=bool), WATER_DENSITY, np.nan)
+
+        df_combined, self.dropped_flows = convert_to_kg(
+            df_elementary,
+            volume_density=water_density,
+            density_col=None,
+            prepare=self.process_dataframe
+        )
 
         # Group by Compartment and Subcompartment
-        grouped_kg = df_combined.groupby(['Compartment', 'Subcompartment', 'Flow Type'])
+        group_cols = ([dataset_col] if dataset_col is not None else []) + GROUP_COLUMNS
+        grouped_kg = df_combined.groupby(group_cols, observed=True)
 
         return df_combined, grouped_kg
 
+    def _element_fractions(self, df):
+        """
+        Returns two sparse (flows x elements) CSR matrices of mass fractions per kg of flow:
+        one from the compound compositions matched in the flow names, one from the
+        '<element name> content (dimensionless)' columns (e.g. 'carbon content'). Columns
+        follow self.elements. Most flows hold a few elements at most, so whole stacked
+        databases fit in memory.
+        """
+        from scipy import sparse
+
+        compound_fractions = self.compound_matcher.composition_matrix(df['Name'], sparse=True)
+        if is_enabled():
+            count('compound_matches', (np.diff(compound_fractions.indptr) > 0).sum())
+
+        # Content properties are named by element, as in ecoinvent and the intermediate processor
+        rows, cols, values = [], [], []
+        for i, symbol in enumerate(self.elements):
+            content_col = f"{self.periodic_table[symbol]} content (dimensionless)"
+            if content_col in df.columns:
+                content = df[content_col].to_numpy(dtype=float)
+                nonzero = np.flatnonzero(content)
+                rows.append(nonzero)
+                cols.append(np.full(len(nonzero), i))
+                values.append(content[nonzero])
+        content_fractions = sparse.csr_matrix(
+            (np.concatenate(values) if values else np.empty(0),
+             (np.concatenate(rows) if rows else np.empty(0, dtype=np.int64),
+              np.concatenate(cols) if cols else np.empty(0, dtype=np.int64))),
+            shape=(len(df), len(self.elements)))
+
+        return compound_fractions, content_fractions
+
+    @timed('elementary.calculate_elemental_composition')
     def calculate_elemental_composition(self, df_combined, grouped_kg):
-        results = []
-        elemental_composition = {symbol: 0.0 for symbol in self.periodic_table.keys()}
-
-        for (comp, subcomp, flow_type), group in grouped_kg:
-            total_amount = group['Amount'].sum()
-            group_composition = {symbol: 0.0 for symbol in self.periodic_table.keys()}
-
-            for index, row in group.iterrows():
-                amount = row['Amount']
-                flow_name = row['Name'].lower()
-
-                for compound, composition in self.compound_compositions.items():
-                    if compound.lower() in flow_name:
-                        for element_name, fraction in composition.items():
-                            element_content = fraction * amount
-                            symbol = [key for key, value in self.periodic_table.items() if value == element_name][0]
-                            group_composition[symbol] += element_content
-
-                for element_name, symbol in self.periodic_table.items():
-                    content_col = f"{element_name} content (dimensionless)"
-                    if content_col in df_combined.columns:
-                        element_content = row[content_col] * amount
-                        group_composition[symbol] += element_content
-
-            for symbol in group_composition:
-                group_composition[symbol] /= total_amount
-
-            group_result = {'Compartment': comp, 'Subcompartment': subcomp, 'Flow Type': flow_type, 'Amount': total_amount}
-            group_result.update(group_composition)
-            results.append(group_result)
-
-        df_el_combined = pd.DataFrame(results)
+        from scipy import sparse
+
+        # Dataset key first when the flows of many datasets are grouped at once
+        group_cols = list(grouped_kg.keys)
+
+        # Rows with a missing group key are dropped by groupby, skip them too
+        codes = grouped_kg.ngroup().reindex(df_combined.index).to_numpy()
+        rows = np.flatnonzero(codes >= 0)
+        if len(rows) == 0:
+            return pd.DataFrame()
+        group_codes = codes[rows].astype(np.int64)
+        n_groups = grouped_kg.ngroups
+
+        # Sparse flows x elements contribution matrix, in kg of element
+        amounts = df_combined['Amount'].to_numpy(dtype=float)
+        compound_fractions, content_fractions = self._element_fractions(df_combined)
+        contributions = (compound_fractions + content_fractions).multiply(amounts[:, None]).tocsr()
+
+        # One pass over the flows for the group amounts and one sparse product for the contents
+        total_amounts = np.bincount(group_codes, weights=amounts[rows], minlength=n_groups)
+        membership = sparse.csr_matrix((np.ones(len(rows)), (group_codes, np.arange(len(rows)))),
+                                       shape=(n_groups, len(rows)))
+        # Contents become compositions in place, only one groups x elements array is built
+        group_compositions = (membership @ contributions[rows]).toarray()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            group_compositions /= total_amounts[:, None]
+
+        # Group labels in ngroup() order, from the first row of each group
+        _, first_rows = np.unique(group_codes, return_index=True)
+        df_el_combined = df_combined[group_cols].iloc[rows[first_rows]].reset_index(drop=True)
+        df_el_combined['Amount'] = total_amounts
+        df_el_combined = pd.concat([df_el_combined, pd.DataFrame(group_compositions, columns=self.elements)], axis=1)
         return df_el_combined
 
-    def calculate_total_concentration(self, df_el_combined):
-        results = []
-
-        for index, row in df_el_combined.iterrows():
-            total_concentration_sum = sum(row[symbol] for symbol in self.periodic_table.keys() if symbol in row)
-            rest_value = 1 - total_concentration_sum
-
-            if total_concentration_sum != 1:
-                df_el_combined.at[index, 'rest'] = rest_value
-            else:
-                df_el_combined.at[index, 'rest'] = 0
-
-            direction = "to" if row['Flow Type'] == "Output" else "from"
-            result = {
-                'Flow Name': f"{row['Flow Type']} Elementary flow {direction} {row['Compartment']}, {row['Subcompartment']}",
-                'Sub Process': 'No information',
-                'Amount': row['Amount'],
-                'Unit': 'kg',
-                'Flow Type': row['Flow Type'],
-                'Compartment': row['Compartment'],
-                'Subcompartment': row['Subcompartment'],
-                'rest': rest_value
-            }
-
-            for symbol in self.periodic_table.keys():
-                if symbol in row:
-                    result[symbol] = row[symbol]
-
-            results.append(result)
-
-        df_total_concentration = pd.DataFrame(results)
-        cols = [col for col in df_total_concentration.columns if col != 'rest'] + ['rest']
-        df_total_concentration = df_total_concentration[cols]
-
+    @timed('elementary.monte_carlo_composition')
+    def monte_carlo_composition(self, df_combined, iterations=10000, percentiles=DEFAULT_PERCENTILES,
+                                seed=None, chunk_bytes=64 * 1024 ** 2, dataset_col=None):
+        """
+        Monte Carlo version of calculate_elemental_composition: flow amounts are sampled from
+        their lognormal uncertainty and the percentiles of the group amount, element mass
+        fractions and rest are returned per compartment group (one row per percentile).
+        """
+        compound_fractions, content_fractions = self._element_fractions(df_combined)
+        group_cols = ([dataset_col] if dataset_col is not None else []) + GROUP_COLUMNS
+        return monte_carlo_table(df_combined, group_cols,
+                                 compound_fractions + content_fractions, self.elements,
+                                 iterations=iterations, percentiles=percentiles, seed=seed, chunk_bytes=chunk_bytes)
+
+    @timed('elementary.calculate_total_concentration')
+    def calculate_total_concentration(self, df_el_combined, compact=False, float32=False, dataset_col=None):
+        """
+        With compact=True the result is returned as a CompactConcentrations (sparse element
+        columns, categorical labels, optionally float32); call .to_dense() for the DataFrame.
+        With dataset_col, that column of a stacked table is kept as the first column.
+        """
+        symbols = [symbol for symbol in self.elements if symbol in df_el_combined.columns]
+        element_values = df_el_combined[symbols].to_numpy(dtype=float)
+
+        # Column by column keeps the left-to-right summation of the former per-row sum()
+        total_concentration_sum = np.zeros(len(df_el_combined))
+        for i in range(len(symbols)):
+            total_concentration_sum = total_concentration_sum + element_values[:, i]
+        rest_values = 1 - total_concentration_sum
+        count('rest_negative.elementary', (rest_values < 0).sum())
+        df_el_combined['rest'] = rest_values
+
+        flow_type = df_el_combined['Flow Type'].astype(str).reset_index(drop=True)
+        compartment = df_el_combined['Compartment'].reset_index(drop=True)
+        subcompartment = df_el_combined['Subcompartment'].reset_index(drop=True)
+        direction = pd.Series(np.where(flow_type == "Output", "to", "from"))
+
+        df_total_concentration = pd.DataFrame({
+            'Flow Name': flow_type + " Elementary flow " + direction + " " + compartment.astype(str) + ", " + subcompartment.astype(str),
+            'Sub Process': 'No information',
+            'Amount': df_el_combined['Amount'].reset_index(drop=True),
+            'Unit': 'kg',
+            'Flow Type': df_el_combined['Flow Type'].reset_index(drop=True),
+            'Compartment': compartment,
+            'Subcompartment': subcompartment,
+        })
+        if dataset_col is not None:
+            df_total_concentration.insert(0, dataset_col, df_el_combined[dataset_col].reset_index(drop=True))
+        df_total_concentration = pd.concat([
+            df_total_concentration,
+            pd.DataFrame(element_values, columns=symbols),
+            pd.DataFrame({'rest': rest_values})
+        ], axis=1)
+
+        if compact:
+            return CompactConcentrations.from_dense(df_total_concentration, self.elements, float32=float32)
         return df_total_concentration
 
+    def process_datasets(self, df_elementary, dataset_col='Dataset ID', compact=False, float32=False):
+        """
+        Runs get_grouped_flows, calculate_elemental_composition and calculate_total_concentration
+        once over a stacked table of many datasets (e.g. from EcoSpoldDatabaseExtractor) and
+        returns their stacked total concentrations, the same rows as a loop over datasets.
+        """
+        df_combined, grouped_kg = self.get_grouped_flows(df_elementary, dataset_col=dataset_col)
+        df_el_combined = self.calculate_elemental_composition(df_combined, grouped_kg)
+        if df_el_combined.empty:
+            return df_el_combined
+        return self.calculate_total_concentration(df_el_combined, compact=compact, float32=float32,
+                                                  dataset_col=dataset_col)
+
 # Usage example
 # processor = ElementaryFlowProcessor()
 # df_combined, grouped_kg = processor.get_grouped_flows(df_elementary)
 # df_el_combined = processor.calculate_elemental_composition(df_combined, grouped_kg)
 # df_total_concentration = processor.calculate_total_concentration(df_el_combined)
+# df_mc = processor.monte_carlo_composition(df_combined, iterations=10000, seed=42)
+# Whole database at once, df_elementary from EcoSpoldDatabaseExtractor
+# df_total_concentrations = processor.process_datasets(df_elementary, dataset_col='Dataset ID')
 # print(df_total_concentration)
@@ -1,40 +1,35 @@
 import pandas as pd
 
-class IntermediateFlowProcessor:
-    def __init__(self, periodic_table):
-        self.periodic_table = periodic_table
-        self.element_symbols = list(periodic_table.keys())
-
-    def get_m3_to_kg(self, df):
-        # Process kg flows
-        df_kg = df[df['Unit'] == 'kg'].copy()
-        df_kg = self.process_dataframe(df_kg)
-
-        # Process m3 flows
-        df_m3 = df[df['Unit'] == 'm3'].copy()
-        df_m3 = self.process_dataframe(df_m3)
-
-        # Convert columns to numeric
-        df_m3['Amount'] = pd.to_numeric(df_m3['Amount'], errors='coerce')
-        if 'wet mass (kg)' in df_m3.columns:
-            df_m3['wet mass (kg)'] = pd.to_numeric(df_m3['wet mass (kg)'], errors='coerce')
-        if 'dry mass (kg)' in df_m3.columns:
-            df_m3['dry mass (kg)'] = pd.to_numeric(df_m3['dry mass (kg)'], errors='coerce')
-
-        # Apply conversions
-        for index, row in df_m3.iterrows():
-            if 'wet mass (kg)' in df_m3.columns:
-                df_m3.at[index, 'Amount'] = df_m3.at[index, 'Amount'] * df_m3.at[index, 'wet mass (kg)']
-            else:
-                df_m3.at[index, 'Amount'] *= 1000  # m³ → kg conversion
-
-            if 'dry mass (kg)' in df_m3.columns:
-                df_m3.at[index, 'dry mass (kg)'] /= 1000  # Scale dry mass
+from data_extraction.extract_ei_spold_data import numeric_column
+from data_extraction.instrumentation import count, timed
 
-            df_m3.at[index, 'Unit'] = 'kg'  # Update unit
+from .Compact_results import CompactConcentrations
+from .Composition_registry import get_composition_registry
+from .Monte_carlo import DEFAULT_PERCENTILES, monte_carlo_table
+from .Unit_converter import WATER_DENSITY, convert_to_kg
 
-        return pd.concat([df_kg, df_m3], ignore_index=True)
 
+class IntermediateFlowProcessor:
+    def __init__(self, periodic_table=None):
+        self.registry = get_composition_registry()
+        self.periodic_table = periodic_table if periodic_table is not None else self.registry.periodic_table
+        self.element_symbols = list(self.periodic_table.keys())
+        # Rows dropped by the last unit conversion, with a 'Drop Reason' column
+        self.dropped_flows = pd.DataFrame()
+
+    @timed('intermediate.get_m3_to_kg')
+    def get_m3_to_kg(self, df):
+        # Convert every convertible unit to kg, dry mass is rescaled per kg of flow
+        df_kg, self.dropped_flows = convert_to_kg(
+            df,
+            volume_density=WATER_DENSITY,
+            density_col='wet mass (kg)',
+            rescale_cols=['dry mass (kg)'],
+            prepare=self.process_dataframe
+        )
+        return df_kg
+
+    @timed('intermediate.process_dataframe')
     def process_dataframe(self, df):
         if not df.empty:
             numeric_cols = ['Amount', 'dry mass (kg)'] + \
@@ -45,11 +40,17 @@ class IntermediateFlowProcessor:
 
             for col in numeric_cols:
                 if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+                    df[col] = numeric_column(df[col]).fillna(0)
 
         return df
 
-    def calculate_flow_composition(self, df_intermediate):
+    @timed('intermediate.calculate_flow_composition')
+    def calculate_flow_composition(self, df_intermediate, compact=False, float32=False, dataset_col=None):
+        """
+        With compact=True the result is returned as a CompactConcentrations (sparse element
+        columns, categorical labels, optionally float32); call .to_dense() for the DataFrame.
+        With dataset_col, that column of a stacked table is kept as the first column.
+        """
         df_intermediate_kg = df_intermediate[df_intermediate['Unit'] == 'kg'].copy()
 
         numeric_cols = [col for col in df_intermediate_kg.columns
@@ -68,11 +69,14 @@ class IntermediateFlowProcessor:
 
         if 'water content (dimensionless)' in df_intermediate_kg.columns:
             water_content = df_intermediate_kg['water content (dimensionless)'] * df_intermediate_kg['dry mass (kg)']
-            element_data['H'] += (2 * 1.008 / (2 * 1.008 + 15.999)) * water_content
-            element_data['O'] += (15.999 / (2 * 1.008 + 15.999)) * water_content
+            water_fractions = self.registry.mass_fractions('H2O')
+            element_data['H'] += water_fractions['H'] * water_content
+            element_data['O'] += water_fractions['O'] * water_content
 
         element_df = pd.DataFrame(element_data, index=df_intermediate_kg.index)
-        element_df['rest'] = (1 - element_df.sum(axis=1)).clip(lower=0)
+        rest = 1 - element_df.sum(axis=1)
+        count('rest_negative.intermediate', (rest < 0).sum())
+        element_df['rest'] = rest.clip(lower=0)
 
         base_df = df_intermediate_kg.copy()
         base_df = base_df.rename(columns={'Name': 'Flow Name'})
@@ -88,14 +92,36 @@ class IntermediateFlowProcessor:
             'Subcompartment'
         ]
 
+        if dataset_col is not None:
+            standard_columns.insert(0, dataset_col)
+
         result_df = pd.concat([
             base_df[standard_columns],
             element_df[self.element_symbols],
             element_df[['rest']]
         ], axis=1)
 
+        if compact:
+            return CompactConcentrations.from_dense(result_df, self.element_symbols, float32=float32)
         return result_df
 
+    @timed('intermediate.monte_carlo_composition')
+    def monte_carlo_composition(self, df_intermediate, iterations=10000, percentiles=DEFAULT_PERCENTILES,
+                                seed=None, chunk_bytes=64 * 1024 ** 2, dataset_col=None):
+        """
+        Samples the kg flow amounts from their lognormal uncertainty and returns, per
+        compartment group, the percentiles of the group amount, element mass fractions
+        (the per-flow compositions of calculate_flow_composition weighted by amount) and rest.
+        """
+        df_composition = self.calculate_flow_composition(df_intermediate, dataset_col=dataset_col)
+        if 'Uncertainty Variance' in df_intermediate.columns:
+            df_composition['Uncertainty Variance'] = df_intermediate.loc[df_composition.index, 'Uncertainty Variance']
+        group_cols = ([dataset_col] if dataset_col is not None else []) + ['Compartment', 'Subcompartment', 'Flow Type']
+        return monte_carlo_table(df_composition, group_cols,
+                                 df_composition[self.element_symbols].to_numpy(dtype=float), self.element_symbols,
+                                 iterations=iterations, percentiles=percentiles, seed=seed, chunk_bytes=chunk_bytes)
+
+    @timed('intermediate.flip_negative_amounts')
     def flip_negative_amounts(self, df_intermediate):
         df_intermediate = df_intermediate.copy()
         df_intermediate['Amount'] = pd.to_numeric(df_intermediate['Amount'], errors='coerce')
@@ -103,10 +129,21 @@ class IntermediateFlowProcessor:
         df_intermediate.loc[df_intermediate['Amount'] < 0, 'Amount'] = -df_intermediate['Amount']
         return df_intermediate
 
+    def process_datasets(self, df_intermediate, dataset_col='Dataset ID', compact=False, float32=False):
+        """
+        Runs get_m3_to_kg, flip_negative_amounts and calculate_flow_composition once over a
+        stacked table of many datasets and returns their stacked flow compositions.
+        """
+        df_intermediate_kg = self.flip_negative_amounts(self.get_m3_to_kg(df_intermediate))
+        return self.calculate_flow_composition(df_intermediate_kg, compact=compact, float32=float32,
+                                               dataset_col=dataset_col)
+
 # Usage example
-# periodic_table = {...}  # Define your periodic table here
-# processor = IntermediateFlowProcessor(periodic_table)
+# processor = IntermediateFlowProcessor()  # periodic table defaults to the shared registry
 # df_intermediate1 = processor.get_m3_to_kg(df_intermediate)
 # df_intermediate2 = processor.flip_negative_amounts(df_intermediate1)
 # result_df_intermediate = processor.calculate_flow_composition(df_intermediate2)
+# df_mc = processor.monte_carlo_composition(df_intermediate2, iterations=10000, seed=42)
+# Whole database at once, df_intermediate from EcoSpoldDatabaseExtractor
+# result_df_intermediates = processor.process_datasets(df_intermediate, dataset_col='Dataset ID')
 # print(result_df_intermediate)
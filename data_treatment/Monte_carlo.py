@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+
+from data_extraction.instrumentation import count, timed
+
+DEFAULT_PERCENTILES = (2.5, 50, 97.5)
+
+
+def lognormal_sigmas(df, variance_col='Uncertainty Variance'):
+    """
+    Standard deviations of ln(amount) from the EcoSpold02 lognormal variance. Flows without
+    a usable variance ("No uncertainty", "No variance", missing) get 0 and stay fixed.
+    """
+    if variance_col not in df.columns:
+        return np.zeros(len(df))
+    variances = pd.to_numeric(df[variance_col], errors='coerce').to_numpy(dtype=float)
+    return np.sqrt(np.where(np.isfinite(variances) & (variances > 0), variances, 0.0))
+
+
+def _block_groups(iterations, n_elements, chunk_bytes):
+    # Half of chunk_bytes for the (iterations x groups x elements) block kept until its
+    # percentiles are taken (np.percentile copies it), half for the batches of draws
+    per_group = 2 * 8 * iterations * (n_elements + 2)
+    return max(1, (chunk_bytes // 2) // per_group)
+
+
+def _chunk_iterations(iterations, n_sampled, n_contents, chunk_bytes):
+    # Draws (chunk x sampled flows, a few copies) and the dense (chunk x group contents) product
+    per_iteration = max(1, 8 * (3 * n_sampled + 2 * n_contents))
+    return int(min(iterations, max(1, (chunk_bytes // 2) // per_iteration)))
+
+
+@timed('monte_carlo.propagate')
+def propagate_uncertainty(amounts, sigmas, fractions, codes, n_groups, iterations=10000,
+                          percentiles=DEFAULT_PERCENTILES, seed=None, chunk_bytes=64 * 1024 ** 2):
+    """
+    Samples every flow amount as lognormal around its deterministic amount (the geometric
+    mean, as in EcoSpold02) and pushes whole (iterations x flows) batches through the group
+    composition math: group amount = sum of flow amounts, group composition = sum of
+    amount * fractions / group amount. Flows with sigma 0 are folded into constant terms.
+
+    Groups are processed in blocks sized from chunk_bytes (at least one group per block),
+    and each block's percentiles are taken before the next, so memory stays bounded however
+    many groups there are. Every group draws from its own stream of seed, so results do not
+    depend on chunk_bytes.
+
+    codes give the group of each flow (-1 to skip it). Returns the percentiles over
+    iterations of the group amounts (P x groups), compositions (P x groups x elements)
+    and rest (P x groups).
+    """
+    from scipy import sparse
+
+    amounts = np.asarray(amounts, dtype=float)
+    sigmas = np.asarray(sigmas, dtype=float)
+    codes = np.asarray(codes)
+    percentiles = np.asarray(percentiles, dtype=float)
+
+    # Elements absent from every flow stay at 0, only the others are sampled
+    fractions = sparse.csr_matrix(fractions)
+    n_all_elements = fractions.shape[1]
+    active_elements = np.unique(fractions.tocoo().col)
+    fractions = fractions[:, active_elements]
+    n_elements = len(active_elements)
+
+    # Constant group terms of the flows without uncertainty
+    in_group = codes >= 0
+    sampled = (sigmas > 0) & in_group
+    fixed_rows = np.flatnonzero(in_group & ~sampled)
+    fixed_totals = np.bincount(codes[fixed_rows], weights=amounts[fixed_rows], minlength=n_groups)
+    fixed_membership = sparse.csr_matrix((np.ones(len(fixed_rows)), (codes[fixed_rows], np.arange(len(fixed_rows)))),
+                                         shape=(n_groups, len(fixed_rows)))
+    fixed_contents = fixed_membership @ fractions[fixed_rows].multiply(amounts[fixed_rows][:, None]).tocsr()
+    fixed_contents = np.asarray(fixed_contents.todense())
+
+    # Sampled flows ordered by group, each group's flows are contiguous
+    sampled_rows = np.flatnonzero(sampled)
+    sampled_rows = sampled_rows[np.argsort(codes[sampled_rows], kind='stable')]
+    count('monte_carlo.sampled_flows', len(sampled_rows))
+    group_starts = np.searchsorted(codes[sampled_rows], np.arange(n_groups + 1))
+    group_seeds = np.random.SeedSequence(seed).spawn(n_groups)
+
+    amount_percentiles = np.empty((len(percentiles), n_groups))
+    composition_percentiles = np.zeros((len(percentiles), n_groups, n_all_elements))
+    rest_percentiles = np.empty((len(percentiles), n_groups))
+
+    block_groups = _block_groups(iterations, n_elements, chunk_bytes)
+    for first in range(0, n_groups, block_groups):
+        last = min(first + block_groups, n_groups)
+        n_block = last - first
+        rows = sampled_rows[group_starts[first]:group_starts[last]]
+        local_codes = codes[rows] - first
+        offsets = group_starts[first:last + 1] - group_starts[first]
+
+        # rows x (block groups * elements) contributions per kg of flow, mostly zeros
+        membership = sparse.csr_matrix((np.ones(len(rows)), (np.arange(len(rows)), local_codes)),
+                                       shape=(len(rows), n_block))
+        coo = fractions[rows].tocoo()
+        contributions = sparse.csr_matrix((coo.data, (coo.row, local_codes[coo.row] * n_elements + coo.col)),
+                                          shape=(len(rows), n_block * n_elements))
+        # ln-space parameters, the sign of negative amounts is kept
+        log_medians = np.log(np.abs(amounts[rows]))
+        signs = np.sign(amounts[rows])
+        block_sigmas = sigmas[rows]
+        rngs = [np.random.default_rng(group_seeds[group]) for group in range(first, last)]
+
+        chunk = _chunk_iterations(iterations, len(rows), n_block * n_elements, chunk_bytes)
+        totals = np.empty((iterations, n_block))
+        compositions = np.empty((iterations, n_block, n_elements))
+        for start in range(0, iterations, chunk):
+            stop = min(start + chunk, iterations)
+            samples = np.empty((stop - start, len(rows)))
+            for i, rng in enumerate(rngs):
+                if offsets[i + 1] > offsets[i]:
+                    samples[:, offsets[i]:offsets[i + 1]] = rng.standard_normal((stop - start, offsets[i + 1] - offsets[i]))
+            samples *= block_sigmas
+            samples += log_medians
+            np.exp(samples, out=samples)
+            samples *= signs
+
+            chunk_totals = fixed_totals[first:last] + (membership.T @ samples.T).T
+            chunk_contents = fixed_contents[first:last].reshape(-1) + (contributions.T @ samples.T).T
+            totals[start:stop] = chunk_totals
+            with np.errstate(divide='ignore', invalid='ignore'):
+                compositions[start:stop] = chunk_contents.reshape(stop - start, n_block, n_elements) / chunk_totals[:, :, None]
+
+        amount_percentiles[:, first:last] = np.percentile(totals, percentiles, axis=0)
+        rest_percentiles[:, first:last] = np.percentile(1 - compositions.sum(axis=2), percentiles, axis=0)
+        composition_percentiles[:, first:last, active_elements] = np.percentile(compositions, percentiles, axis=0)
+        del totals, compositions
+
+    return amount_percentiles, composition_percentiles, rest_percentiles
+
+
+def monte_carlo_table(df, group_cols, fractions, element_columns, amount_col='Amount', iterations=10000,
+                      percentiles=DEFAULT_PERCENTILES, seed=None, chunk_bytes=64 * 1024 ** 2):
+    """
+    Groups df by group_cols and returns one row per group and percentile: the group columns,
+    'Percentile', 'Amount', one column per element and 'rest'. Each column holds its own
+    percentile, so the element columns of a row need not add up to 1 - rest.
+    """
+    grouped = df.groupby(group_cols, sort=True, observed=True)
+    codes = grouped.ngroup().to_numpy()
+    codes = np.where(pd.isna(codes), -1, codes).astype(np.int64)
+    n_groups = grouped.ngroups
+
+    amount_percentiles, composition_percentiles, rest_percentiles = propagate_uncertainty(
+        df[amount_col].to_numpy(dtype=float), lognormal_sigmas(df), fractions, codes, n_groups,
+        iterations=iterations, percentiles=percentiles, seed=seed, chunk_bytes=chunk_bytes)
+
+    # Group labels in ngroup() order
+    valid = np.flatnonzero(codes >= 0)
+    _, first_rows = np.unique(codes[valid], return_index=True)
+    labels = df[group_cols].iloc[valid[first_rows]].reset_index(drop=True)
+
+    n_percentiles = len(percentiles)
+    df_mc = labels.loc[np.tile(np.arange(n_groups), n_percentiles)].reset_index(drop=True)
+    df_mc['Percentile'] = np.repeat(np.asarray(percentiles, dtype=float), n_groups)
+    df_mc['Amount'] = amount_percentiles.reshape(-1)
+    df_mc = pd.concat([
+        df_mc,
+        pd.DataFrame(composition_percentiles.reshape(-1, len(element_columns)), columns=list(element_columns)),
+        pd.DataFrame({'rest': rest_percentiles.reshape(-1)}),
+    ], axis=1)
+    return df_mc.sort_values(group_cols + ['Percentile'], kind='stable').reset_index(drop=True)
@@ -0,0 +1,255 @@
+"""
+Runs extraction -> unit conversion -> composition -> write over a whole ecoinvent database
+(directory, glob pattern or zip/tar archive of .spold files).
+
+Example:
+    ei-upr-concentration datasets/ results/ --format parquet --extract-workers 8 --compose-workers 2
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+
+import pandas as pd
+
+from data_extraction.extract_ei_database import EcoSpoldDatabaseExtractor
+from data_extraction.instrumentation import JsonLinesSink, disable_instrumentation, enable_instrumentation
+from data_extraction.table_writers import WRITERS, get_table_writer
+
+from .Elementary_flow_processor import ElementaryFlowProcessor
+from .Intermediate_flow_processor import IntermediateFlowProcessor
+
+DATASET_COL = 'Dataset ID'
+# The extraction pool starts while the stage threads run, so its workers are never forked
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+# End of a stage's output
+_DONE = object()
+
+
+class ConcentrationPipeline:
+    def __init__(self, source, output_path, output_format='parquet', extract_workers=None, convert_workers=1,
+                 compose_workers=1, batch_size=16, queue_size=4, streaming=True, partition_by_dataset=False,
+                 cache_dir=None):
+        """
+        Extraction, unit conversion, composition and writing run concurrently, handing batches
+        of batch_size datasets to each other through queues holding at most queue_size
+        batches: the next files are parsed while the previous ones are converted, composed and
+        written, and memory stays bounded however large the database is.
+
+        Extraction runs on a process pool of extract_workers (see EcoSpoldDatabaseExtractor);
+        conversion and composition run on convert_workers/compose_workers threads over the
+        batched processor methods; one thread writes. With several threads per stage,
+        batches may be written out of order, every table keeps its Dataset ID column.
+        With output_format='excel', every batch is aligned on its table's sheet header, and a
+        batch bringing new columns (e.g. other reference product keys in dataset_info)
+        continues on a '<table>_N' sheet under the extended header.
+        """
+        self.source = source
+        self.output_path = output_path
+        self.output_format = output_format
+        self.extract_workers = extract_workers
+        self.convert_workers = convert_workers
+        self.compose_workers = compose_workers
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.streaming = streaming
+        self.partition_by_dataset = partition_by_dataset
+        self.cache_dir = cache_dir
+        self.errors = pd.DataFrame(columns=[DATASET_COL, 'File', 'Error'])
+        self.datasets_written = 0
+        self._stop = threading.Event()
+        self._failures = []
+
+    # Queues
+
+    def _put(self, outbox, item):
+        # Gives up when another stage failed, so no thread waits on a full queue forever
+        while not self._stop.is_set():
+            try:
+                outbox.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, inbox):
+        while not self._stop.is_set():
+            try:
+                return inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, error):
+        self._failures.append(error)
+        self._stop.set()
+
+    def _start_stage(self, name, func, inbox, outbox, workers):
+        # The last worker of a stage to finish closes its output queue
+        remaining = [workers]
+        lock = threading.Lock()
+
+        def work():
+            try:
+                while True:
+                    item = self._get(inbox)
+                    if item is _DONE:
+                        # Let the sibling workers see the end as well
+                        self._put(inbox, _DONE)
+                        break
+                    result = func(item)
+                    if outbox is not None:
+                        self._put(outbox, result)
+            except BaseException as error:
+                self._fail(error)
+            finally:
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last and outbox is not None:
+                    self._put(outbox, _DONE)
+
+        threads = [threading.Thread(target=work, name=f"{name}-{i}", daemon=True) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    # Stages
+
+    def _extract(self, outbox):
+        extractor = EcoSpoldDatabaseExtractor(self.source, max_workers=self.extract_workers,
+                                              streaming=self.streaming, cache_dir=self.cache_dir,
+                                              mp_context=START_METHOD)
+        try:
+            for batch in extractor.iter_batches(self.batch_size):
+                if self._stop.is_set():
+                    return
+                self._put(outbox, batch)
+            self.errors = extractor.errors
+        except BaseException as error:
+            self._fail(error)
+        finally:
+            self._put(outbox, _DONE)
+
+    def _convert(self, batch):
+        # Processors keep the rows dropped by their last conversion, one pair per batch
+        df_info, df_intermediate, df_elementary = batch
+        elementary_processor = ElementaryFlowProcessor()
+        intermediate_processor = IntermediateFlowProcessor()
+
+        df_combined, grouped_kg = None, None
+        if not df_elementary.empty:
+            df_combined, grouped_kg = elementary_processor.get_grouped_flows(df_elementary, dataset_col=DATASET_COL)
+        df_intermediate_kg = None
+        if not df_intermediate.empty:
+            df_intermediate_kg = intermediate_processor.flip_negative_amounts(
+                intermediate_processor.get_m3_to_kg(df_intermediate))
+
+        dropped_flows = {'dropped_elementary_flows': elementary_processor.dropped_flows,
+                         'dropped_intermediate_flows': intermediate_processor.dropped_flows}
+        return df_info, df_combined, grouped_kg, df_intermediate_kg, dropped_flows
+
+    def _compose(self, converted):
+        df_info, df_combined, grouped_kg, df_intermediate_kg, dropped_flows = converted
+        elementary_processor = ElementaryFlowProcessor()
+        intermediate_processor = IntermediateFlowProcessor()
+
+        df_elementary_concentrations = pd.DataFrame()
+        if df_combined is not None:
+            df_el_combined = elementary_processor.calculate_elemental_composition(df_combined, grouped_kg)
+            if not df_el_combined.empty:
+                df_elementary_concentrations = elementary_processor.calculate_total_concentration(
+                    df_el_combined, dataset_col=DATASET_COL)
+        df_intermediate_compositions = pd.DataFrame()
+        if df_intermediate_kg is not None:
+            df_intermediate_compositions = intermediate_processor.calculate_flow_composition(
+                df_intermediate_kg, dataset_col=DATASET_COL)
+
+        return {
+            'dataset_info': df_info,
+            'elementary_concentrations': df_elementary_concentrations,
+            'intermediate_compositions': df_intermediate_compositions,
+            **dropped_flows,
+        }
+
+    def _writer(self):
+        if self.output_format == 'excel':
+            return get_table_writer('excel', self.output_path)
+        return get_table_writer(self.output_format, self.output_path, partition_by_dataset=self.partition_by_dataset)
+
+    def run(self):
+        """
+        Runs the pipeline to the end and returns the number of datasets written. Files that
+        failed to parse are listed in self.errors; the first error of any stage is re-raised.
+        """
+        self._stop.clear()
+        self._failures = []
+        self.datasets_written = 0
+        extracted = queue.Queue(self.queue_size)
+        converted = queue.Queue(self.queue_size)
+        composed = queue.Queue(self.queue_size)
+
+        with self._writer() as writer:
+            def write(tables):
+                for table_name, df in tables.items():
+                    if not df.empty:
+                        writer.write(table_name, df)
+                self.datasets_written += len(tables['dataset_info'])
+
+            extract_thread = threading.Thread(target=self._extract, args=(extracted,), name='extract', daemon=True)
+            extract_thread.start()
+            threads = [extract_thread]
+            threads += self._start_stage('convert', self._convert, extracted, converted, self.convert_workers)
+            threads += self._start_stage('compose', self._compose, converted, composed, self.compose_workers)
+            threads += self._start_stage('write', write, composed, None, 1)
+            for thread in threads:
+                thread.join()
+
+            if self._failures:
+                raise self._failures[0]
+            if not self.errors.empty:
+                writer.write('errors', self.errors)
+
+        return self.datasets_written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help="directory, glob pattern or zip/tar archive of .spold files")
+    parser.add_argument('output', help="output directory (an .xlsx file with --format excel)")
+    parser.add_argument('--format', default='parquet', choices=list(WRITERS))
+    parser.add_argument('--extract-workers', type=int, default=None,
+                        help="parsing processes (default: one per CPU, 1 parses in-process)")
+    parser.add_argument('--convert-workers', type=int, default=1, help="unit conversion threads")
+    parser.add_argument('--compose-workers', type=int, default=1, help="composition threads")
+    parser.add_argument('--batch-size', type=int, default=16, help="datasets per batch handed between stages")
+    parser.add_argument('--queue-size', type=int, default=4, help="batches waiting between two stages at most")
+    parser.add_argument('--dom', action='store_true', help="parse whole documents instead of streaming them")
+    parser.add_argument('--partition', action='store_true', help="one subdirectory per dataset")
+    parser.add_argument('--cache-dir', default=None, help="reuse extractions of unchanged files")
+    parser.add_argument('--instrumentation', default=None, help="JSON lines file for per-stage timings")
+    args = parser.parse_args(argv)
+
+    pipeline = ConcentrationPipeline(
+        args.source, args.output, output_format=args.format, extract_workers=args.extract_workers,
+        convert_workers=args.convert_workers, compose_workers=args.compose_workers, batch_size=args.batch_size,
+        queue_size=args.queue_size, streaming=not args.dom, partition_by_dataset=args.partition,
+        cache_dir=args.cache_dir)
+
+    if args.instrumentation is not None:
+        enable_instrumentation(JsonLinesSink(args.instrumentation))
+    try:
+        datasets_written = pipeline.run()
+    finally:
+        disable_instrumentation()
+
+    print(f"{datasets_written} datasets written to: {os.path.abspath(args.output)}", file=sys.stderr)
+    if not pipeline.errors.empty:
+        print(f"{len(pipeline.errors)} files failed to parse", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+from data_extraction.instrumentation import count, timed
+
+from .Elementary_flow_processor import ElementaryFlowProcessor
+from .Intermediate_flow_processor import IntermediateFlowProcessor
+
+
+class SupplyChainSolver:
+    def __init__(self, df_intermediate, **lu_options):
+        """
+        Technosphere matrix of a whole database, from the intermediate exchanges extracted by
+        EcoSpoldDatabaseExtractor (keyed by Dataset ID and Activity ID). Column j is dataset j:
+        its reference product on the diagonal, and every linked exchange at the row of the
+        dataset supplying it (inputs negative, outputs positive). By-products and exchanges
+        without a supplier in the database are left out and listed in self.unlinked.
+
+        The sparse LU factorization is computed once, on first use, and reused for every
+        demand; element flows added with add_elementary_flows()/add_intermediate_flows()
+        are then propagated along the supply chains by cumulative(). lu_options go to
+        scipy's splu, e.g. permc_spec='NATURAL' for a nearly triangular matrix.
+        """
+        amounts = pd.to_numeric(df_intermediate['Amount'], errors='coerce').to_numpy(dtype=float)
+        group = df_intermediate['Group Number'].astype(str).to_numpy()
+        is_output = (df_intermediate['Flow Type'] == "Output").to_numpy(dtype=bool)
+        is_reference = is_output & (group == '0')
+
+        references = df_intermediate.loc[is_reference, ['Dataset ID', 'Activity ID', 'Product ID']]
+        references = references.drop_duplicates('Dataset ID')
+        self.datasets = pd.Index(references['Dataset ID'], name='Dataset ID')
+        self.products = references.set_index('Dataset ID')
+        supplier_index = {key: i for i, key in enumerate(zip(references['Activity ID'], references['Product ID']))}
+
+        consumers = self.datasets.get_indexer(df_intermediate['Dataset ID'])
+        suppliers = np.array([supplier_index.get(key, -1) for key in
+                              zip(df_intermediate['Activity Link ID'], df_intermediate['Product ID'])], dtype=np.int64)
+        linked = ~is_reference & (suppliers >= 0) & (consumers >= 0) & ~np.isnan(amounts)
+
+        rows = np.concatenate([consumers[is_reference], suppliers[linked]])
+        cols = np.concatenate([consumers[is_reference], consumers[linked]])
+        values = np.concatenate([amounts[is_reference], np.where(is_output[linked], 1.0, -1.0) * amounts[linked]])
+        keep = cols >= 0
+        n = len(self.datasets)
+        # Duplicate entries are summed by the CSC conversion
+        self.technosphere = sparse.csc_matrix((values[keep], (rows[keep], cols[keep])), shape=(n, n))
+
+        self.unlinked = df_intermediate.loc[~is_reference & ~linked & ~(is_output & (group == '2'))]
+        count('supply_chain.linked_exchanges', linked.sum())
+        count('supply_chain.unlinked_exchanges', len(self.unlinked))
+
+        self.flow_labels = pd.MultiIndex.from_tuples([], names=['Source', 'Flow Type', 'Element'])
+        self.flow_matrix = sparse.csr_matrix((0, n))
+        self.lu_options = lu_options
+        self._lu = None
+
+    @property
+    def lu(self):
+        # Factorized once, every later solve reuses it
+        if self._lu is None:
+            self._lu = self._factorize()
+        return self._lu
+
+    @timed('supply_chain.factorize')
+    def _factorize(self):
+        return splu(self.technosphere.tocsc(), **self.lu_options)
+
+    def demand_matrix(self, demand):
+        """
+        Builds the sparse (datasets x demands) right-hand sides from a dataset ID (one unit of
+        its reference product), a list of dataset IDs (one column each), a dict
+        {dataset ID: amount} (one column) or an array of shape (datasets,) or (datasets, k).
+        """
+        n = len(self.datasets)
+        if isinstance(demand, np.ndarray):
+            return sparse.csc_matrix(demand.reshape(n, -1).astype(float))
+        if isinstance(demand, dict):
+            positions = [self._position(dataset_id) for dataset_id in demand]
+            amounts = np.asarray(list(demand.values()), dtype=float)
+            return sparse.csc_matrix((amounts, (positions, np.zeros(len(positions), dtype=np.int64))), shape=(n, 1))
+        if isinstance(demand, str):
+            demand = [demand]
+
+        positions = [self._position(dataset_id) for dataset_id in demand]
+        return sparse.csc_matrix((np.ones(len(positions)), (positions, np.arange(len(positions)))),
+                                 shape=(n, len(positions)))
+
+    def _position(self, dataset_id):
+        position = self.datasets.get_indexer([dataset_id])[0]
+        if position < 0:
+            raise ValueError(f"Unknown dataset {dataset_id!r}.")
+        return position
+
+    @timed('supply_chain.solve')
+    def solve(self, demand):
+        """
+        Returns the scaling vectors (datasets x demands) of every dataset in the supply chain.
+        """
+        return self.lu.solve(self.demand_matrix(demand).toarray())
+
+    def _add_flows(self, source, df_flows, fractions, elements):
+        # flows x elements kg of element, summed per dataset and (Flow Type, element)
+        datasets = self.datasets.get_indexer(df_flows['Dataset ID'])
+        flow_types = df_flows['Flow Type'].astype(str).to_numpy()
+        # fractions may be dense or sparse, only the stored entries are visited
+        contents = sparse.csr_matrix(fractions).multiply(df_flows['Amount'].to_numpy(dtype=float)[:, None]).tocoo()
+        values = np.nan_to_num(contents.data)
+        rows, cols = contents.row, contents.col
+        keep = (datasets[rows] >= 0) & (values != 0)
+
+        labels = pd.MultiIndex.from_arrays([np.full(rows.shape, source, dtype=object), flow_types[rows],
+                                            np.asarray(elements, dtype=object)[cols]])[keep]
+        codes, uniques = pd.factorize(labels, sort=True)
+        block = sparse.csr_matrix((values[keep], (codes, datasets[rows][keep])),
+                                  shape=(len(uniques), len(self.datasets)))
+
+        self.flow_labels = self.flow_labels.append(pd.MultiIndex.from_tuples(list(uniques), names=self.flow_labels.names))
+        self.flow_matrix = sparse.vstack([self.flow_matrix, block], format='csr')
+
+    def add_elementary_flows(self, df_elementary):
+        """
+        Adds the kg of each element in the elementary flows of every dataset, from the unit
+        conversion and compound/content compositions of ElementaryFlowProcessor.
+        """
+        processor = ElementaryFlowProcessor()
+        df_combined, _ = processor.get_grouped_flows(df_elementary)
+        compound_fractions, content_fractions = processor._element_fractions(df_combined)
+        self._add_flows('elementary', df_combined, compound_fractions + content_fractions, processor.elements)
+
+    def add_intermediate_flows(self, df_intermediate_kg):
+        """
+        Adds the kg of each element carried by the intermediate flows of every dataset, from
+        calculate_flow_composition; df_intermediate_kg is the output of get_m3_to_kg (and
+        flip_negative_amounts).
+        """
+        processor = IntermediateFlowProcessor()
+        df_composition = processor.calculate_flow_composition(df_intermediate_kg)
+        df_composition['Dataset ID'] = df_intermediate_kg.loc[df_composition.index, 'Dataset ID']
+        self._add_flows('intermediate', df_composition,
+                        df_composition[processor.element_symbols].to_numpy(dtype=float), processor.element_symbols)
+
+    @timed('supply_chain.cumulative')
+    def cumulative(self, demand, batch_size=1024):
+        """
+        Returns the cumulative element flows (Source, Flow Type, Element) x demands over the
+        whole supply chain. Demands are solved batch_size columns at a time, so thousands
+        of products fit in one call.
+        """
+        rhs = self.demand_matrix(demand)
+        result = np.empty((self.flow_matrix.shape[0], rhs.shape[1]))
+        for start in range(0, rhs.shape[1], batch_size):
+            # Only one batch of dense right-hand sides is alive at a time
+            scaling = self.lu.solve(rhs[:, start:start + batch_size].toarray())
+            result[:, start:start + batch_size] = self.flow_matrix @ scaling
+
+        if isinstance(demand, (list, tuple, str)):
+            columns = pd.Index([demand] if isinstance(demand, str) else list(demand), name='Dataset ID')
+        else:
+            columns = pd.RangeIndex(rhs.shape[1], name='Demand')
+        return pd.DataFrame(result, index=self.flow_labels, columns=columns)
+
+# Usage example
+# df_info, df_intermediate, df_elementary = EcoSpoldDatabaseExtractor(datasets_dir).extract()
+# solver = SupplyChainSolver(df_intermediate)
+# solver.add_elementary_flows(df_elementary)
+# solver.add_intermediate_flows(IntermediateFlowProcessor().get_m3_to_kg(df_intermediate))
+# df_cumulative = solver.cumulative(list(solver.datasets[:1000]))
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+from data_extraction.instrumentation import count, timed
+
+# Unit -> (dimension, factor to the base unit of the dimension: kg or m3)
+UNIT_CONVERSIONS = {
+    'kg': ('mass', 1.0),
+    'g': ('mass', 0.001),
+    't': ('mass', 1000.0),
+    'm3': ('volume', 1.0),
+    'l': ('volume', 0.001),
+}
+
+WATER_DENSITY = 1000.0  # kg/m3
+
+
+@timed('unit_conversion.convert_to_kg')
+def convert_to_kg(df, volume_density=WATER_DENSITY, density_col='wet mass (kg)', rescale_cols=(), prepare=None):
+    """
+    Converts the Amount of every flow to kg with column-wise arithmetic, driven by UNIT_CONVERSIONS.
+
+    Mass units use their fixed factor. Volume units use the per-flow density_col property
+    (kg per unit of flow) where present, otherwise volume_density in kg/m3: a scalar, or a
+    callable returning one value per row of the prepared frame, NaN meaning unknown.
+    rescale_cols are per-unit properties divided by the nominal kg per unit (volumes at
+    water density). prepare, if given, is applied to the rows with a known unit first.
+
+    Returns (df_kg, df_dropped): the converted rows with a fresh index, and the rows that
+    could not be converted with their original index and a 'Drop Reason' column.
+    """
+    dimensions = df['Unit'].map({unit: dimension for unit, (dimension, _) in UNIT_CONVERSIONS.items()})
+    known_unit = dimensions.notna().to_numpy(dtype=bool)
+
+    df_prepared = df.loc[known_unit]
+    if prepare is not None:
+        df_prepared = prepare(df_prepared)
+    df_kg = df_prepared
+
+    units = df_kg['Unit'].astype(object)
+    factors = units.map({unit: factor for unit, (_, factor) in UNIT_CONVERSIONS.items()}).to_numpy(dtype=float)
+    is_volume = (units.map({unit: dimension for unit, (dimension, _) in UNIT_CONVERSIONS.items()}) == 'volume').to_numpy(dtype=bool)
+
+    # kg per unit of flow, and the nominal one used to rescale per-unit properties
+    kg_per_unit = factors.copy()
+    nominal_kg_per_unit = np.where(is_volume, factors * WATER_DENSITY, factors)
+    if is_volume.any():
+        density = volume_density(df_kg) if callable(volume_density) else volume_density
+        density = np.broadcast_to(np.asarray(density, dtype=float), factors.shape)
+        kg_per_unit = np.where(is_volume, factors * density, factors)
+        if density_col is not None and density_col in df_kg.columns:
+            # Per-flow wet mass is already expressed per unit of flow
+            wet_mass = pd.to_numeric(df_kg[density_col], errors='coerce').to_numpy(dtype=float)
+            kg_per_unit = np.where(is_volume & ~np.isnan(wet_mass), wet_mass, kg_per_unit)
+
+    convertible = ~np.isnan(kg_per_unit)
+
+    df_kg = df_kg.assign(Amount=pd.to_numeric(df_kg['Amount'], errors='coerce') * kg_per_unit)
+    for col in rescale_cols:
+        if col in df_kg.columns:
+            df_kg[col] = pd.to_numeric(df_kg[col], errors='coerce') / nominal_kg_per_unit
+    df_kg['Unit'] = 'kg'
+
+    df_dropped = pd.concat([
+        df.loc[~known_unit].assign(**{'Drop Reason': "unknown unit"}),
+        df_prepared.loc[~convertible].assign(**{'Drop Reason': "no density for volume unit"}),
+    ])
+    count('rows_dropped.unit_conversion', len(df_dropped))
+
+    return df_kg.loc[convertible].reset_index(drop=True), df_dropped
@@ -0,0 +1,19 @@
+from .Compound_matcher import CompoundMatcher, get_compound_matcher
+from .Composition_registry import CompositionRegistry, get_composition_registry, mass_fractions, parse_formula
+from .Elementary_flow_processor import ElementaryFlowProcessor
+from .Intermediate_flow_processor import IntermediateFlowProcessor
+from .Unit_converter import UNIT_CONVERSIONS, WATER_DENSITY, convert_to_kg
+from .Compact_results import CompactConcentrations
+from .Monte_carlo import lognormal_sigmas, monte_carlo_table, propagate_uncertainty
+
+
+def __getattr__(name):
+    # scipy's sparse LU is only imported when the supply chain solver is used
+    if name == 'SupplyChainSolver':
+        from .Supply_chain import SupplyChainSolver
+        return SupplyChainSolver
+    # Nor the pipeline and its CLI, so `python -m data_treatment.Pipeline` runs it only once
+    if name == 'ConcentrationPipeline':
+        from .Pipeline import ConcentrationPipeline
+        return ConcentrationPipeline
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")